@@ -2,3 +2,4 @@ from .base import *
 from .management import *
 from .assessment import *
 from .survey import *
+from .report import *
@@ -2,6 +2,7 @@ from django.contrib import admin
 from modeltranslation.admin import TranslationAdmin
 from .base import BaseAdmin
 from ..models.assessment import *
+from ..models.management import ManagementArea
 from ..models.survey import SurveyAnswerLikert
 from ..utils.assessment import enforce_required_attributes, log_assessment_change
 
@@ -34,6 +35,16 @@ class AssessmentChangeInline(admin.TabularInline):
         return False
 
 
+class ManagementAreaListFilter(admin.RelatedFieldListFilter):
+    # default choices load every management area in full, geometry included
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        queryset = ManagementArea.objects.defer_geometry()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return [(ma.pk, str(ma)) for ma in queryset]
+
+
 @admin.register(Assessment)
 class AssessmentAdmin(BaseAdmin, TranslationAdmin):
     list_display = [
@@ -48,9 +59,27 @@ class AssessmentAdmin(BaseAdmin, TranslationAdmin):
         "management_area__name",
         "organization__name",
     ]
-    list_filter = ["status", "data_policy", "year", "management_area"]
+    list_filter = [
+        "status",
+        "data_policy",
+        "year",
+        ("management_area", ManagementAreaListFilter),
+    ]
     inlines = [SurveyAnswerLikertInline, AssessmentFlagInline, AssessmentChangeInline]
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("management_area")
+            .defer(*ManagementArea.geometry_fields("management_area"))
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "management_area":
+            kwargs["queryset"] = ManagementArea.objects.defer_geometry()
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
     def save_model(self, request, obj, form, change):
         if change:
             original_assessment = self.model.objects.get(pk=obj.pk)
@@ -174,7 +174,7 @@ class CountryListFilter(admin.SimpleListFilter):
 
     def lookups(self, request, model_admin):
         countries = []
-        for o in model_admin.model.objects.all():
+        for o in model_admin.model.objects.only(self.parameter_name):
             _countries = getattr(o, self.parameter_name)
             if not isinstance(_countries, list):
                 _countries = [_countries]
@@ -21,6 +21,10 @@ class ManagementAreaAdmin(BaseAdmin, TranslationAdmin):
     list_filter = ("governance_type", CountryListFilter)
     filter_horizontal = ["regions", "stakeholder_groups", "support_sources"]
     inlines = [ManagementAreaZoneInline]
+    readonly_fields = BaseAdmin.readonly_fields + [
+        "geometry_pending",
+        "geometry_import_error",
+    ]
 
 
 @admin.register(ManagementAreaZone)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .base import BaseAdmin
+from ..models import ReportExport
+
+
+@admin.register(ReportExport)
+class ReportExportAdmin(BaseAdmin):
+    list_display = ["report", "filetype", "language", "status", "created_by"] + BaseAdmin.list_display
+    list_filter = ["report", "filetype", "status"]
+    readonly_fields = BaseAdmin.readonly_fields + ["query_hash", "data_generation"]
@@ -12,6 +12,8 @@ INVALID_HEADER = "invalid_header"
 INVALID_HEADER_CELLS = "invalid_header_cells"
 INVALID_FILE_LOAD = "invalid_file_load"
 ASSESSMENT_ID_MISMATCH = "assessment_id_mismatch"
+ASSESSMENT_NOT_FOUND = "assessment_not_found"
+PERMISSION_DENIED = "permission_denied"
 INVALID_SHEET = "invalid_sheet"
 INVALID_QUESTIONS = "invalid_questions"
 INVALID_CHOICES = "invalid_choices"
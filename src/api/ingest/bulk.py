@@ -0,0 +1,183 @@
+from concurrent.futures import as_completed
+from io import RawIOBase
+from pathlib import PurePosixPath
+from zipfile import ZipFile
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpRequest
+from rest_framework.exceptions import PermissionDenied
+
+from ..models import Assessment
+from ..permissions import AssessmentReadOnlyOrAuthenticatedUserPermission
+from ..utils import chunked
+from ..utils.assessment import (
+    assessment_xlsx_has_errors,
+    get_assessment_related_queryset,
+    question_bank_version,
+)
+from . import (
+    ingest_400,
+    ERROR,
+    UNSUPPORTED_FILE_TYPE,
+    ASSESSMENT_NOT_FOUND,
+    PERMISSION_DENIED,
+)
+from .workers import build_workbook, get_executor, read_workbook
+from .xlsx import AssessmentXLSX, WS_DEF
+
+
+TITLE_CELL = f"B{WS_DEF['survey']['title']['row']}"
+
+
+def get_zip_members(zf):
+    members = []
+    for info in zf.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.parts[0] == "__MACOSX" or path.name.startswith("."):
+            continue
+        members.append(info.filename)
+    return members
+
+
+def get_permission_error(assessment, user):
+    # the rules applied to a single workbook upload, AssessmentViewSet.xlsx POST
+    if user.is_superuser:
+        return None
+    http_request = HttpRequest()
+    http_request.method = "POST"
+    try:
+        permitted = AssessmentReadOnlyOrAuthenticatedUserPermission().user_assessment_permissions(
+            http_request, None, assessment, user
+        )
+    except PermissionDenied as e:
+        return str(e.detail)
+    if not permitted:
+        return f"User {user} may not edit assessment {assessment}."
+    return None
+
+
+def import_workbooks(zf, user, dryrun=False, batch_size=None):
+    """
+    Import the AssessmentXLSX workbooks in a zip, each into the assessment whose id is in its title cell.
+    Workbooks are parsed in the shared process pool, then checked against the assessments visible to and editable by user,
+    and their answers saved batch_size workbooks to a transaction; a workbook with errors is not saved, without
+    affecting the others.
+    :param zf: ZipFile from utils.open_zip
+    :return: ({file name: {"assessment": id, "saved": bool, "validations": {ingest_400 errors}}}, has errors)
+    """
+    report = {}
+    workbooks = []
+    for name in get_zip_members(zf):
+        report[name] = {"assessment": None, "saved": False, "validations": {}}
+        if name.lower().endswith(".xlsx"):
+            workbooks.append(name)
+        else:
+            error = ingest_400(UNSUPPORTED_FILE_TYPE, "file type not supported; supported types: xlsx")
+            report[name]["validations"].update(error)
+
+    parsed = {}
+    version = question_bank_version()
+    executor = get_executor()
+    futures = {executor.submit(read_workbook, zf.read(name), version): name for name in workbooks}
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            parsed[name] = future.result()
+        except Exception as e:
+            error = ingest_400(ERROR, f"error reading workbook: {e}")
+            report[name]["validations"].update(error)
+
+    ids = {assessment_id for assessment_id, _, _ in parsed.values() if isinstance(assessment_id, int)}
+    assessments = get_assessment_related_queryset(user, Assessment).filter(pk__in=ids).in_bulk()
+    to_save = []
+    for name in workbooks:
+        if name not in parsed:
+            continue
+        assessment_id, answers, validations = parsed[name]
+        result = report[name]
+        result["assessment"] = assessment_id
+        result["validations"].update(validations)
+        if any(v["level"] == ERROR for v in validations.values()):
+            continue
+
+        assessment = assessments.get(assessment_id)
+        if assessment is None:
+            error = ingest_400(
+                ASSESSMENT_NOT_FOUND,
+                f"assessment id {assessment_id} in {TITLE_CELL} not found",
+                {"user_assessmment_id": assessment_id, "cell": TITLE_CELL},
+            )
+            result["validations"].update(error)
+            continue
+        permission_error = get_permission_error(assessment, user)
+        if permission_error:
+            error = ingest_400(PERMISSION_DENIED, permission_error, {"assessment_id": assessment.pk})
+            result["validations"].update(error)
+            continue
+        to_save.append((name, assessment, answers))
+
+    questions = AssessmentXLSX(None).questions
+    for batch in chunked(to_save, batch_size or settings.XLSX_IMPORT_BATCH_SIZE):
+        with transaction.atomic():
+            for name, assessment, answers in batch:
+                assessment_xlsx = AssessmentXLSX(assessment, questions=questions)
+                if answers:
+                    assessment_xlsx.answers = answers
+                    assessment_xlsx.submit_answers(dryrun=dryrun, user=user)
+                report[name]["validations"].update(assessment_xlsx.validations)
+                report[name]["saved"] = not dryrun and not assessment_xlsx_has_errors(assessment_xlsx)
+
+    has_errors = any(
+        v["level"] == ERROR for result in report.values() for v in result["validations"].values()
+    )
+    return report, has_errors
+
+
+class ZipStream(RawIOBase):
+    # unseekable sink for ZipFile, emptied as each member is written; zipfile then uses data descriptors
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buffer += b
+        return len(b)
+
+    def pop(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_workbooks(assessment_ids, language):
+    """
+    Zip of the AssessmentXLSX workbook of each assessment, built in the shared process pool from the stored
+    templates and yielded as each one completes. Failures can't change the response status once streaming has
+    started, so they are listed in an errors.txt member instead.
+    """
+    stream = ZipStream()
+    errors = []
+    version = question_bank_version()
+    executor = get_executor()
+    futures = {executor.submit(build_workbook, pk, language, version): pk for pk in assessment_ids}
+    try:
+        with ZipFile(stream, "w") as zf:
+            for future in as_completed(futures):
+                try:
+                    filename, data = future.result()
+                except Exception as e:
+                    errors.append(f"assessment {futures[future]}: {e}")
+                    continue
+                # workbooks are already deflated
+                zf.writestr(filename, data)
+                yield stream.pop()
+            if errors:
+                zf.writestr("errors.txt", "\n".join(errors))
+        yield stream.pop()
+    finally:
+        # a closed response (client gone) drops the workbooks not yet started
+        for future in futures:
+            future.cancel()
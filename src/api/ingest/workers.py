@@ -0,0 +1,75 @@
+"""
+Process pool for bulk AssessmentXLSX imports and exports, shared by all requests served by a process and started on
+first use. Workers are spawned rather than forked, so they don't share the parent's database connections; they
+import this module before Django is set up, so app modules are only imported inside the worker functions.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import django
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import translation
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# {(question bank version, language): compiled questions}, kept by each worker across tasks
+_questions = {}
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        # a worker that died (e.g. killed for memory) breaks the pool; start a new one for later tasks
+        if _executor is None or getattr(_executor, "_broken", False):
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.XLSX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def get_questions(version, language):
+    # version is the parent's question_bank_version(), so a task only queries the database to compile
+    # questions for a version (or language) the worker hasn't seen
+    from .xlsx import AssessmentXLSX
+
+    key = (version, language)
+    if key not in _questions:
+        _questions.clear()
+        with translation.override(language):
+            _questions[key] = AssessmentXLSX(None).questions
+    return _questions[key]
+
+
+def read_workbook(data, version):
+    # the parent looks up the assessment from title_assessment_id; keys are the same in every language
+    from .xlsx import AssessmentXLSX
+
+    # workers outlive requests, so drop connections the database has since timed out, as runworker does
+    close_old_connections()
+    questions = get_questions(version, settings.LANGUAGE_CODE)
+    assessment_xlsx = AssessmentXLSX(None, questions=questions)
+    assessment_xlsx.load_from_file(BytesIO(data))
+    return (
+        assessment_xlsx.title_assessment_id,
+        assessment_xlsx.answers,
+        assessment_xlsx.validations,
+    )
+
+
+def build_workbook(assessment_id, language, version):
+    from ..models import Assessment
+    from .xlsx import AssessmentXLSX
+
+    close_old_connections()
+    assessment = Assessment.objects.get(pk=assessment_id)
+    with translation.override(language):
+        assessment_xlsx = AssessmentXLSX(assessment, questions=get_questions(version, language))
+        assessment_xlsx.generate_from_template()
+    with BytesIO() as f:
+        assessment_xlsx.workbook.save(f)
+        return assessment_xlsx.get_filename(), f.getvalue()
@@ -1,19 +1,28 @@
+import hashlib
 from copy import copy
+from datetime import datetime
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db import transaction
+from modeltranslation.utils import build_localized_fieldname, get_language
 from openpyxl import load_workbook, Workbook
 from openpyxl.styles import Alignment, DEFAULT_FONT, Protection
 from openpyxl.utils import get_column_letter
 from openpyxl.utils.exceptions import InvalidFileException
 from openpyxl.worksheet.datavalidation import DataValidation
 # from openpyxl.worksheet.protection import SheetProtection
+from tempfile import TemporaryFile
 from zipfile import BadZipFile
 
-from ..models import SurveyQuestionLikert, SurveyAnswerLikert
-from ..resources.survey import SurveyAnswerLikertSerializer
+from ..models import SurveyAnswerLikert
+from ..models.survey import LIKERT_CHOICES
 from ..utils import strip_html
 from ..utils.assessment import (
+    DATA_GENERATION,
     assessment_xlsx_has_errors,
+    bump_generation,
     enforce_required_attributes,
+    question_bank_version,
     questionlikerts,
 )
 from . import (
@@ -32,6 +41,12 @@ from . import (
 )
 
 
+LIKERT_VALUES = {value for value, label in LIKERT_CHOICES}
+# storage directory of workbooks without title or answers; see AssessmentXLSX.generate_from_template
+TEMPLATE_DIR = "AssessmentXLSX/templates"
+# bump on any change to how workbooks are built (WS_DEF, headers, styles, protection, validations),
+# so stored templates built by earlier code are no longer used
+TEMPLATE_FORMAT_VERSION = 1
 # TODO: create elinordata.org subdomain for this s3 bucket
 DOCUMENTATION_URL = "https://elinor-user-files.s3.amazonaws.com/dev/Document/2/Elinor_assessment_tool_protocol_v2022.1.pdf"
 bold = copy(DEFAULT_FONT)
@@ -126,17 +141,40 @@ def get_user_choice(choice_str):
         raise InvalidChoice
 
 
+def prune_templates(current_directory):
+    # templates of superseded formats and question bank versions are never requested again
+    directories, files = default_storage.listdir(TEMPLATE_DIR)
+    # templates stored directly in TEMPLATE_DIR predate the versioned directories
+    for file in files:
+        default_storage.delete(f"{TEMPLATE_DIR}/{file}")
+    for directory in directories:
+        path = f"{TEMPLATE_DIR}/{directory}"
+        if path == current_directory:
+            continue
+        _, files = default_storage.listdir(path)
+        for file in files:
+            default_storage.delete(f"{path}/{file}")
+
+
 class AssessmentXLSX:
-    def __init__(self, assessment):
+    def __init__(self, assessment, questions=None):
+        # assessment may be None to only parse a workbook (see ingest.bulk), with questions compiled beforehand
         self.assessment = assessment
-        enforce_required_attributes(self.assessment)
-        self._questions = []
+        if self.assessment is not None:
+            enforce_required_attributes(self.assessment)
+        self._questions = questions or []
+        self._question_index = {}
         self._answers = {}
         self._ws_survey = None
         self._ws_choices = None
         self.workbook = None
         self.xlsxfile = None
+        self.title_assessment_id = None
         self.validations = {}
+        # {question key: row in choices sheet}, recorded as the choices are written
+        self.choice_rows = {}
+        # {question key: DataValidation}, one per question however many cells use it
+        self.data_validations = {}
         self.ws_def = WS_DEF
         self.cols = {
             "key": self.get_survey_col("key"),
@@ -205,9 +243,15 @@ class AssessmentXLSX:
 
         return self._questions
 
+    @property
+    def question_index(self):
+        if not self._question_index:
+            self._question_index = {q.key: q for q in self.questions}
+        return self._question_index
+
     @property
     def answers(self):
-        if not self._answers:
+        if not self._answers and self.assessment is not None:
             answers = (
                 SurveyAnswerLikert.objects.filter(assessment=self.assessment)
                 .select_related("question", "question__attribute")
@@ -283,12 +327,15 @@ class AssessmentXLSX:
             self.validations.update(error)
 
     def add_survey_validation(self, qkey):
-        val_formula = ""
         # Could use question.choices but doesn't work if a choice has a comma
-        for i, row in enumerate(self.ws_choices.iter_rows()):
-            key = row[0].value
-            if key == qkey:
-                val_formula = f"{self.sheetnames[1]}!$B${i + 1}:$E${i + 1}"
+        validation = self.data_validations.get(qkey)
+        if validation is not None:
+            return validation
+
+        val_formula = ""
+        row = self.choice_rows.get(qkey)
+        if row is not None:
+            val_formula = f"{self.sheetnames[1]}!$B${row}:$E${row}"
         validation = DataValidation(
             type="list",
             allow_blank=True,
@@ -298,6 +345,7 @@ class AssessmentXLSX:
             error="Please select a choice from the list",
         )
         self.ws_survey.add_data_validation(validation)
+        self.data_validations[qkey] = validation
         return validation
 
     # noinspection PyMethodMayBeStatic
@@ -312,26 +360,37 @@ class AssessmentXLSX:
                 cell.protection = Protection(locked=False)
 
     def get_question_by_key(self, key):
-        for question in self.questions:
-            if question.key == key:
-                return question
-        return None
+        return self.question_index.get(key)
 
-    def generate_from_assessment(self):
+    def get_filename(self):
+        date_string = str(datetime.now().date().isoformat())
+        return f"elinor-assessment-{self.assessment.pk}_{date_string}.xlsx"
+
+    def write_title(self):
+        titlecrow = self.ws_def[self.sheetnames[0]]["title"]["row"]
+        self.ws_survey.cell(row=titlecrow, column=1, value=self.assessment.name)
+        self.ws_survey.cell(row=titlecrow, column=2, value=self.assessment.pk)
+
+    def generate_from_assessment(self, template=False):
+        # with template, the title and answers are left empty; see generate_from_template
         self.workbook = Workbook(iso_dates=True)
         self.workbook.worksheets[0].title = self.sheetnames[0]
         self.workbook.create_sheet(self.sheetnames[1])
 
         self.write_header(self.sheetnames[0], section="title")
-        titlecrow = self.ws_def[self.sheetnames[0]]["title"]["row"]
-        self.ws_survey.cell(row=titlecrow, column=1, value=self.assessment.name)
-        self.ws_survey.cell(row=titlecrow, column=2, value=self.assessment.pk)
+        if not template:
+            self.write_title()
         self.write_header(self.sheetnames[0], section="intro")
         self.write_header(self.sheetnames[0])
         self.write_header(self.sheetnames[1])
         for q in self.questions:
             choices = [q.key] + [c for c in q.choices]
             self.ws_choices.append(choices)
+            self.choice_rows[q.key] = self.ws_choices.max_row
+
+        attribute_questions = {}
+        for question in self.questions:
+            attribute_questions.setdefault(question.attribute_id, []).append(question)
 
         arow = self.ws_def[self.sheetnames[0]]["columns"]["row"] + 1
         for attribute in self.assessment.attributes.order_by("order", "name"):
@@ -341,40 +400,90 @@ class AssessmentXLSX:
             attr_cell.font = bold
             attr_cell.alignment = wrapped_alignment
             arow += 1
-            for question in self.questions:
-                if question.attribute == attribute:
-                    qtext = f"{question.number}. {question.text}"
-                    answer = self.answers.get(question.key, {}) or {}
-                    choice = answer.get("choice", "")
-                    choice_text = get_choice_by_answer(question, choice)
-                    validation = self.add_survey_validation(question.key)
-                    explanation = answer.get("explanation", "")
-                    rationale = strip_html(question.rationale)
-                    information = strip_html(question.information)
-                    guidance = strip_html(question.guidance)
-
-                    self.ws_survey.row_dimensions[arow].height = 32
-                    qrow = [
-                        qtext,
-                        question.key,
-                        choice_text,
-                        explanation,
-                        rationale,
-                        information,
-                        guidance,
-                    ]
-                    for i, val in enumerate(qrow):
-                        _cell = self.ws_survey.cell(row=arow, column=i + 1, value=val)
-                        if i == 0:
-                            _cell.alignment = wrapped_alignment
-                        if i == 2:
-                            validation.add(_cell)
-
-                    arow += 1
+            for question in attribute_questions.get(attribute.pk, []):
+                qtext = f"{question.number}. {question.text}"
+                answer = {} if template else self.answers.get(question.key, {}) or {}
+                choice = answer.get("choice", "")
+                choice_text = get_choice_by_answer(question, choice)
+                validation = self.add_survey_validation(question.key)
+                explanation = answer.get("explanation", "")
+                rationale = strip_html(question.rationale)
+                information = strip_html(question.information)
+                guidance = strip_html(question.guidance)
+
+                self.ws_survey.row_dimensions[arow].height = 32
+                qrow = [
+                    qtext,
+                    question.key,
+                    choice_text,
+                    explanation,
+                    rationale,
+                    information,
+                    guidance,
+                ]
+                for i, val in enumerate(qrow):
+                    _cell = self.ws_survey.cell(row=arow, column=i + 1, value=val)
+                    if i == 0:
+                        _cell.alignment = wrapped_alignment
+                    if i == 2:
+                        validation.add(_cell)
+
+                arow += 1
 
         self.protect_sheet(self.ws_choices)
         self.protect_sheet(self.ws_survey, ["C", "D"])
 
+    def get_template_name(self):
+        # one directory per template format and question bank version, so superseded ones can be pruned whole;
+        # within it, questions and choices depend on the language and survey rows on the attribute set
+        version = f"{TEMPLATE_FORMAT_VERSION}:{question_bank_version()}"
+        directory = f"{TEMPLATE_DIR}/{hashlib.sha256(version.encode()).hexdigest()[:16]}"
+        attributes = list(self.assessment.attributes.order_by("pk").values_list("pk", flat=True))
+        key = f"{get_language()}:{attributes}"
+        return f"{directory}/{hashlib.sha256(key.encode()).hexdigest()}.xlsx"
+
+    def save_template(self, name):
+        self.generate_from_assessment(template=True)
+        with TemporaryFile() as f:
+            self.workbook.save(f)
+            f.seek(0)
+            # a concurrent request may have saved it first; both copies are identical
+            if not default_storage.exists(name):
+                default_storage.save(name, File(f))
+        prune_templates(name.rsplit("/", 1)[0])
+
+    def generate_from_template(self):
+        """
+        Same workbook as generate_from_assessment, built by loading a stored template (headers, choices sheet,
+        styles, validations, protection) for the assessment's attribute set, and writing only the title and answers.
+        Templates are saved on first use.
+        """
+        name = self.get_template_name()
+        if not default_storage.exists(name):
+            self.save_template(name)
+        with default_storage.open(name, "rb") as f:
+            self.workbook = load_workbook(f)
+        self._ws_survey = None
+        self._ws_choices = None
+
+        self.write_title()
+        start_row = self.ws_def[self.sheetnames[0]]["columns"]["row"] + 1
+        key_cells = self.ws_survey.iter_rows(
+            min_row=start_row, min_col=self.cols["key"] + 1, max_col=self.cols["key"] + 1
+        )
+        for (key_cell,) in key_cells:
+            answer = self.answers.get(key_cell.value)
+            question = self.get_question_by_key(key_cell.value)
+            if not answer or not question:
+                continue
+            choice_text = get_choice_by_answer(question, answer.get("choice", ""))
+            self.ws_survey.cell(row=key_cell.row, column=self.cols["answer"] + 1, value=choice_text)
+            self.ws_survey.cell(
+                row=key_cell.row,
+                column=self.cols["explanation"] + 1,
+                value=answer.get("explanation", ""),
+            )
+
     def check_file_structure(self, file):
         try:
             self.workbook = load_workbook(file, read_only=True)
@@ -383,10 +492,14 @@ class AssessmentXLSX:
             # exception message is about a zip file, which would be confusing to users. So we'll return our own.
             error = ingest_400(INVALID_FILE_LOAD, "invalid xlsx file")
             self.validations.update(error)
+            return
+        if self.ws_survey is None:  # missing sheet error recorded
+            return
 
         titlecrow = self.ws_def[self.sheetnames[0]]["title"]["row"]
         user_assessmment_id = self.ws_survey.cell(row=titlecrow, column=2).value
-        if user_assessmment_id != self.assessment.pk:
+        self.title_assessment_id = user_assessmment_id
+        if self.assessment is not None and user_assessmment_id != self.assessment.pk:
             error = ingest_400(
                 ASSESSMENT_ID_MISMATCH,
                 f"assessment id {user_assessmment_id} in B{titlecrow} does not match requested assessment {self.assessment.pk}",
@@ -452,51 +565,63 @@ class AssessmentXLSX:
 
         self.answers = user_answers
 
-    def submit_answers(self, dryrun):
-        answer_serializers = []
-        answer_serializer_errors = []
-        for key in self.answers.keys():
-            question = SurveyQuestionLikert.objects.get(key=key)
-            answer_dict = {
-                "assessment": self.assessment.pk,
-                "question": question.pk,
-                "choice": self.answers[key]["choice"],
-                "explanation": self.answers[key]["explanation"],
-            }
-            try:
-                answer = SurveyAnswerLikert.objects.get(
-                    assessment=self.assessment, question=question
-                )
-                answer_serializer = SurveyAnswerLikertSerializer(
-                    answer, data=answer_dict
-                )
-            except SurveyAnswerLikert.DoesNotExist:
-                answer_serializer = SurveyAnswerLikertSerializer(data=answer_dict)
-
-            answer_serializer.is_valid()
-            if answer_serializer.errors:
-                print(answer_serializer.errors)
-                answer_serializer_errors.append(answer_serializer.errors)
-            else:
-                answer_serializers.append(answer_serializer)
-
-        if answer_serializer_errors:
+    def get_answer_errors(self):
+        # validated in memory against the compiled question bank, in place of a serializer per answer
+        errors = []
+        for key, answer in self.answers.items():
+            if self.get_question_by_key(key) is None:
+                errors.append({"key": key, "question": [f'Invalid key "{key}" - object does not exist.']})
+            choice = answer["choice"]
+            if choice is not None and choice not in LIKERT_VALUES:
+                errors.append({"key": key, "choice": [f'"{choice}" is not a valid choice.']})
+        return errors
+
+    def submit_answers(self, dryrun, user=None):
+        answer_errors = self.get_answer_errors()
+        if answer_errors:
             # TODO: attach cell references to self.answers, and store with validations
             error = ingest_400(
                 SURVEYANSWERLIKERTSERIALIZER,
                 "invalid answers",
-                {"errors": answer_serializer_errors},
+                {"errors": answer_errors},
             )
             self.validations.update(error)
             return
 
+        answers = [
+            SurveyAnswerLikert(
+                assessment=self.assessment,
+                question_id=self.get_question_by_key(key).pk,
+                choice=answer["choice"],
+                explanation=answer["explanation"],
+                created_by=user,
+                updated_by=user,
+            )
+            for key, answer in self.answers.items()
+        ]
+        # explanation is translated: the base column and the current language's column are both written
+        update_fields = [
+            "choice",
+            "explanation",
+            build_localized_fieldname("explanation", get_language()),
+            "updated_on",
+        ]
+        if user is not None:
+            update_fields.append("updated_by")
+
         with transaction.atomic():
             sid = transaction.savepoint()
             successful_save = False
             try:
-                for a in answer_serializers:
-                    a.save()
+                SurveyAnswerLikert.objects.bulk_create(
+                    answers,
+                    update_conflicts=True,
+                    unique_fields=["assessment", "question"],
+                    update_fields=update_fields,
+                )
                 successful_save = True
+                # bulk_create sends no signals; invalidate cached tiles and clusters (dropped on rollback)
+                bump_generation(DATA_GENERATION)
             except Exception as e:
                 error = ingest_400(
                     ANSWER_SAVE,
@@ -507,4 +632,4 @@ class AssessmentXLSX:
                 if dryrun is True or successful_save is False:
                     transaction.savepoint_rollback(sid)
                 else:
-                    transaction.savepoint_commit(sid)
\ No newline at end of file
+                    transaction.savepoint_commit(sid)
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from api.models import ManagementArea
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute containment and overlap relations between management area polygons. "
+        "Saving a management area updates its own relations; run this after bulk loads or to backfill."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids",
+            nargs="*",
+            type=int,
+            help="Management area ids to recompute relations for (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        queryset = ManagementArea.objects.all()
+        if options["ids"]:
+            queryset = queryset.filter(pk__in=options["ids"])
+        start = time.perf_counter()
+        inserted = queryset.update_spatial_relations()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{inserted} relations computed in {elapsed:.1f}s")
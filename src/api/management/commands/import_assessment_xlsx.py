@@ -0,0 +1,53 @@
+import json
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from zipfile import BadZipFile
+from api.ingest.bulk import import_workbooks
+from api.utils import open_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a zip of assessment XLSX workbooks, each into the assessment whose id is in its title cell, "
+        "with the permissions of --user. Prints the validation report per file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="zip of workbooks")
+        parser.add_argument("--user", required=True, help="username answers are saved as")
+        parser.add_argument(
+            "--dryrun",
+            action="store_true",
+            default=False,
+            help="Validate and report without saving answers",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.XLSX_IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            user = get_user_model().objects.get_by_natural_key(options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"user {options['user']} not found")
+
+        with open(options["path"], "rb") as f:
+            try:
+                zf = open_zip(f)
+            except BadZipFile as e:
+                raise CommandError(str(e))
+            report, has_errors = import_workbooks(
+                zf,
+                user,
+                dryrun=options["dryrun"],
+                batch_size=options["batch_size"],
+            )
+
+        self.stdout.write(json.dumps(report, indent=2, default=str))
+        saved = sum(result["saved"] for result in report.values())
+        self.stdout.write(
+            f"{saved} of {len(report)} files saved ({time.perf_counter() - start:.1f}s)"
+        )
+        if has_errors:
+            raise CommandError("some files have errors; see report")
@@ -0,0 +1,48 @@
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.wdpa import BATCH_SIZE, load_wdpa, read_wdpa
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a local WDPA export (GeoPackage, shapefile or File Geodatabase) into protected areas and, "
+        "optionally, draft management areas keyed by WDPA ID. Rerunning updates drafts whose WDPA record changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="WDPA export file(s)")
+        parser.add_argument(
+            "--country",
+            action="append",
+            default=[],
+            help="ISO3 code of a country to load; may be repeated (default: all)",
+        )
+        parser.add_argument(
+            "--management-areas",
+            action="store_true",
+            default=False,
+            help="Also create/update draft management areas with WDPA geometry",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            records = read_wdpa(
+                options["paths"], iso3={c.upper() for c in options["country"]}
+            )
+        except ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+        self.stdout.write(
+            f"{len(records)} WDPA sites read in {time.perf_counter() - start:.1f}s"
+        )
+
+        counts = load_wdpa(
+            records,
+            options["paths"],
+            management_areas=options["management_areas"],
+            batch_size=options["batch_size"],
+        )
+        summary = ", ".join(f"{k.replace('_', ' ')}: {v}" for k, v in counts.items())
+        self.stdout.write(f"{summary} ({time.perf_counter() - start:.1f}s)")
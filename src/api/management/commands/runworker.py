@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.resources.management import process_geometry_import
+from api.resources.reports.export import (
+    claim_report_export,
+    prune_report_exports,
+    run_report_export,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued background jobs: report exports and management area geometry imports. "
+        "Removes report exports older than REPORT_EXPORT_MAX_AGE when the queue is empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Exit when the queue is empty instead of polling",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=int,
+            default=5,
+            help="Seconds to wait between polls of an empty queue",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            export = claim_report_export()
+            if export is not None:
+                run_report_export(export)
+                self.stdout.write(f"{export.pk}: {export}")
+                continue
+
+            management_area = process_geometry_import()
+            if management_area is not None:
+                self.stdout.write(f"{management_area.pk}: {management_area} geometry imported")
+                continue
+
+            # the queue is empty: remove expired exports before waiting
+            pruned = prune_report_exports()
+            if pruned:
+                self.stdout.write(f"{pruned} expired report exports removed")
+
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:12
+
+import api.models.report
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0003_assessment_collection_method_text_mg_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('report', models.CharField(choices=[('assessments', 'assessments')], max_length=50)),
+                ('filetype', models.CharField(choices=[('csv', 'CSV'), ('geojson', 'GeoJSON')], max_length=20)),
+                ('language', models.CharField(blank=True, max_length=15)),
+                ('query', models.TextField(blank=True)),
+                ('query_hash', models.CharField(blank=True, db_index=True, editable=False, max_length=64)),
+                ('status', models.PositiveSmallIntegerField(choices=[(10, 'pending'), (20, 'running'), (30, 'complete'), (40, 'failed')], default=10)),
+                ('data_generation', models.CharField(blank=True, editable=False, max_length=255)),
+                ('file', models.FileField(blank=True, null=True, upload_to=api.models.report.report_export_path)),
+                ('error', models.TextField(blank=True)),
+                ('started_on', models.DateTimeField(blank=True, null=True)),
+                ('completed_on', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created_by', to=settings.AUTH_USER_MODEL)),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated_by', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'report export',
+                'ordering': ['-created_on'],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.23 on 2026-10-19 11:40
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+# derived geometries as computed when this migration was written (simplify tolerances 0.01 and 0.001 degrees);
+# inlined rather than imported from the model module, whose expressions may change
+POPULATE_DERIVED_GEOMETRIES_SQL = """
+UPDATE {table} SET
+    polygon_low = ST_Multi(ST_SimplifyPreserveTopology(polygon, 0.01)),
+    polygon_medium = ST_Multi(ST_SimplifyPreserveTopology(polygon, 0.001)),
+    bbox = ST_Envelope(polygon),
+    centroid = COALESCE(ST_Centroid(polygon), point),
+    geodesic_area = ST_Area(polygon::geography) / 10000
+"""
+
+
+def populate_derived_geometries(apps, schema_editor):
+    ManagementArea = apps.get_model('api', 'ManagementArea')
+    table = schema_editor.quote_name(ManagementArea._meta.db_table)
+    schema_editor.execute(POPULATE_DERIVED_GEOMETRIES_SQL.format(table=table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_reportexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='managementarea',
+            name='polygon_low',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='managementarea',
+            name='polygon_medium',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='managementarea',
+            name='bbox',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='managementarea',
+            name='centroid',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='managementarea',
+            name='geodesic_area',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='geodesic area (ha)'),
+        ),
+        migrations.RunPython(populate_derived_geometries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_managementarea_derived_geometries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportexport',
+            name='filetype',
+            field=models.CharField(choices=[('csv', 'CSV'), ('geojson', 'GeoJSON'), ('fgb', 'FlatGeobuf')], max_length=20),
+        ),
+    ]
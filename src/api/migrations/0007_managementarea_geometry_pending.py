@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_alter_reportexport_filetype'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='managementarea',
+            name='geometry_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='managementarea',
+            name='geometry_import_error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
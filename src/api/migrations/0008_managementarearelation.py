@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_managementarea_geometry_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManagementAreaRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relation', models.CharField(choices=[('within', 'within'), ('contains', 'contains'), ('overlaps', 'overlaps')], max_length=20)),
+                ('overlap_ratio', models.FloatField(blank=True, null=True)),
+                ('related_overlap_ratio', models.FloatField(blank=True, null=True)),
+                ('computed_on', models.DateTimeField(auto_now=True)),
+                ('management_area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spatial_relations', to='api.managementarea')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.managementarea')),
+            ],
+            options={
+                'verbose_name': 'management area relation',
+                'unique_together': {('management_area', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_managementarearelation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='managementarea',
+            name='wdpa_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
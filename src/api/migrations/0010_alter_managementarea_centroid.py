@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-19 15:30
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_managementarea_wdpa_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='managementarea',
+            name='centroid',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, editable=False, null=True, srid=4326),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alter_managementarea_centroid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protectedarea',
+            name='wdpa_id',
+            field=models.IntegerField(blank=True, editable=False, null=True, unique=True, verbose_name='WDPA ID'),
+        ),
+    ]
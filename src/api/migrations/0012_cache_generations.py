@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-19 20:15
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # table of the "generations" DatabaseCache (settings.CACHES); skipped if it already exists
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_protectedarea_wdpa_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -14,6 +14,7 @@ from .base import (
 )
 from .management import (
     ManagementArea,
+    ManagementAreaRelation,
     ManagementAreaZone,
 )
 from .assessment import (
@@ -23,3 +24,4 @@ from .assessment import (
     Collaborator,
 )
 from .survey import SurveyQuestionLikert, SurveyAnswerLikert
+from .report import ReportExport
@@ -138,7 +138,10 @@ class ManagementAuthority(BaseChoiceModel):
 
 
 class ProtectedArea(BaseChoiceModel):
-    pass
+    # set for protected areas loaded by the `load_wdpa` command, which matches sites on it rather than on name
+    wdpa_id = models.IntegerField(
+        null=True, blank=True, unique=True, editable=False, verbose_name="WDPA ID"
+    )
 
 
 class Region(BaseChoiceModel):
@@ -1,6 +1,11 @@
 import datetime
+from django.conf import settings
 from django.contrib.gis.db import models
+from django.contrib.gis.db.models.functions import Centroid, Envelope
 from django.contrib.postgres.fields import ArrayField
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from .base import (
@@ -12,13 +17,140 @@ from .base import (
     StakeholderGroup,
     SupportSource,
 )
-from ..utils.management import get_multipolygon_from_import_file
+from ..utils.management import (
+    get_content_hash,
+    get_multipolygon_from_import_file,
+    validate_import_file,
+)
+from ..utils.spatial import GeodesicArea, Multi, SimplifyPreserveTopology
+
+
+def derived_geometries():
+    """
+    Expressions computing the stored simplified polygons, bbox, centroid and geodesic area (ha) from polygon/point,
+    for use in queryset.update() so the work is done by PostGIS.
+    """
+    tolerances = settings.GEOMETRY_SIMPLIFY_TOLERANCES
+    return {
+        "polygon_low": Multi(
+            SimplifyPreserveTopology("polygon", tolerances[ManagementArea.SIMPLIFY_LOW])
+        ),
+        "polygon_medium": Multi(
+            SimplifyPreserveTopology("polygon", tolerances[ManagementArea.SIMPLIFY_MEDIUM])
+        ),
+        "bbox": Envelope("polygon"),
+        "centroid": Coalesce(Centroid("polygon"), "point"),
+        "geodesic_area": GeodesicArea("polygon") / 10000,
+    }
+
+
+# Relations of area a to every area b whose polygon shares interior with it. The && join is served by the polygon
+# GiST index; ST_Covers/ST_Intersects only run on bbox matches, and the intersection is only built for partial
+# overlaps, since for containment the overlap is the smaller area (whose geodesic_area is already stored).
+SPATIAL_RELATIONS_SQL = """
+WITH pairs AS (
+    SELECT
+        a.id AS management_area_id,
+        b.id AS related_id,
+        a.polygon AS a_polygon,
+        b.polygon AS b_polygon,
+        a.geodesic_area AS a_area,
+        b.geodesic_area AS b_area,
+        CASE
+            WHEN ST_Covers(b.polygon, a.polygon) THEN '{within}'
+            WHEN ST_Covers(a.polygon, b.polygon) THEN '{contains}'
+            ELSE '{overlaps}'
+        END AS relation
+    FROM {area_table} a
+    JOIN {area_table} b
+        ON a.polygon && b.polygon
+        AND a.id <> b.id
+        AND ST_Intersects(a.polygon, b.polygon)
+        AND NOT ST_Touches(a.polygon, b.polygon)
+    WHERE {where}
+), measured AS (
+    SELECT
+        *,
+        CASE relation
+            WHEN '{within}' THEN a_area
+            WHEN '{contains}' THEN b_area
+            ELSE ST_Area(ST_Intersection(a_polygon, b_polygon)::geography) / 10000
+        END AS overlap_area
+    FROM pairs
+)
+INSERT INTO {relation_table}
+    (management_area_id, related_id, relation, overlap_ratio, related_overlap_ratio, computed_on)
+SELECT
+    management_area_id,
+    related_id,
+    relation,
+    LEAST(overlap_area / NULLIF(a_area, 0), 1),
+    LEAST(overlap_area / NULLIF(b_area, 0), 1),
+    now()
+FROM measured
+"""
+
+
+class ManagementAreaQuerySet(models.QuerySet):
+    def update_derived_geometries(self):
+        return self.update(**derived_geometries())
+
+    def update_spatial_relations(self):
+        """
+        Recompute the ManagementAreaRelation rows to and from the areas in this queryset, set-based in PostGIS.
+        Both directions are stored, so an area's relations are one indexed lookup on management_area.
+        :return: number of relation rows inserted
+        """
+        scope, scope_params = self.order_by().values("pk").query.sql_with_params()
+
+        def relations_sql(where):
+            return SPATIAL_RELATIONS_SQL.format(
+                area_table=ManagementArea._meta.db_table,
+                relation_table=ManagementAreaRelation._meta.db_table,
+                within=ManagementAreaRelation.WITHIN,
+                contains=ManagementAreaRelation.CONTAINS,
+                overlaps=ManagementAreaRelation.OVERLAPS,
+                where=where,
+            )
+
+        inserted = 0
+        with transaction.atomic():
+            ManagementAreaRelation.objects.filter(
+                Q(management_area__in=self.values("pk")) | Q(related__in=self.values("pk"))
+            ).delete()
+            with connection.cursor() as cursor:
+                # relations from areas in scope, then those from outside areas to areas in scope
+                cursor.execute(relations_sql(f"a.id IN ({scope})"), scope_params)
+                inserted += cursor.rowcount
+                cursor.execute(
+                    relations_sql(f"b.id IN ({scope}) AND a.id NOT IN ({scope})"),
+                    scope_params + scope_params,
+                )
+                inserted += cursor.rowcount
+        return inserted
+
+    def defer_geometry(self):
+        return self.defer(*ManagementArea.geometry_fields())
 
 
 class ManagementArea(BaseModel):
     _polygon_from_file = None
+    _import_file_hash = None
     assessment_lookup = "assessment"
 
+    SIMPLIFY_LOW = "low"
+    SIMPLIFY_MEDIUM = "medium"
+    SIMPLIFY_FULL = "full"
+    SIMPLIFICATIONS = (SIMPLIFY_LOW, SIMPLIFY_MEDIUM, SIMPLIFY_FULL)
+    SOURCE_GEOMETRY_FIELDS = ["polygon", "point"]
+    DERIVED_GEOMETRY_FIELDS = [
+        "polygon_low",
+        "polygon_medium",
+        "bbox",
+        "centroid",
+        "geodesic_area",
+    ]
+
     LOCAL = "local"
     NATIONAL = "national"
     INTERNATIONAL = "international"
@@ -35,7 +167,7 @@ class ManagementArea(BaseModel):
         null=True,
         related_name="versions",
     )
-    # just a FK; for actual spatial query use polygon intersection
+    # just a FK; for actual spatial query use polygon intersection, or the computed spatial_relations
     containedby = models.ForeignKey(
         "self",
         on_delete=models.SET_NULL,
@@ -79,19 +211,95 @@ class ManagementArea(BaseModel):
     map_image = models.ImageField(upload_to="upload", blank=True, null=True)
     geospatial_sources = models.TextField(blank=True)
     objectives = models.TextField(blank=True)
+    # derived from polygon/point on save; see derived_geometries
+    polygon_low = models.MultiPolygonField(
+        srid=4326, null=True, blank=True, editable=False, spatial_index=False
+    )
+    polygon_medium = models.MultiPolygonField(
+        srid=4326, null=True, blank=True, editable=False, spatial_index=False
+    )
+    bbox = models.PolygonField(
+        srid=4326, null=True, blank=True, editable=False, spatial_index=False
+    )
+    # indexed for nearest-neighbour (<->) ordering
+    centroid = models.PointField(srid=4326, null=True, blank=True, editable=False)
+    geodesic_area = models.FloatField(
+        null=True, blank=True, editable=False, verbose_name="geodesic area (ha)"
+    )
+    # set when a large import_file is left for the background worker to parse into polygon
+    geometry_pending = models.BooleanField(default=False, editable=False)
+    geometry_import_error = models.TextField(blank=True, editable=False)
+    # hash of the WDPA record this area was last loaded from by the `load_wdpa` command; blank if not loaded
+    wdpa_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    objects = ManagementAreaQuerySet.as_manager()
+
+    @classmethod
+    def geometry_fields(cls, lookup=""):
+        # for defer() on paths that never output geometry; lookup is the relation path to a management area
+        prefix = f"{lookup}__" if lookup else ""
+        fields = ["polygon", "point", *cls.DERIVED_GEOMETRY_FIELDS]
+        return [f"{prefix}{f}" for f in fields]
+
+    def geometry_changed(self):
+        """
+        Whether polygon or point differ from the stored row. Compared on save rather than tracked from load, so
+        loading management areas (lists, reports) costs nothing extra; geometry fields still deferred were never set.
+        """
+        if self._state.adding:
+            return True
+        fields = [field for field in self.SOURCE_GEOMETRY_FIELDS if field in self.__dict__]
+        if not fields:
+            return False
+        stored = ManagementArea.objects.filter(pk=self.pk).values(*fields).first()
+        if stored is None:
+            return True
+        return any(getattr(self, field) != stored[field] for field in fields)
+
+    @classmethod
+    def polygon_field(cls, simplify):
+        if simplify == cls.SIMPLIFY_FULL:
+            return "polygon"
+        return f"polygon_{simplify}"
 
     def clean(self):
         if self.import_file._committed is False:
-            self._polygon_from_file = get_multipolygon_from_import_file(
-                self.import_file
-            )
+            content_hash = get_content_hash(self.import_file.file)
+            if content_hash == self._import_file_hash:
+                return  # already handled for this instance, e.g. by serializer validation before save
 
+            if self.import_file.size > settings.GEOMETRY_IMPORT_ASYNC_SIZE:
+                validate_import_file(self.import_file)
+                self._polygon_from_file = None
+                self.geometry_pending = True
+            else:
+                self._polygon_from_file = get_multipolygon_from_import_file(
+                    self.import_file, content_hash
+                )
+                self.geometry_pending = False
+            self.geometry_import_error = ""
+            self._import_file_hash = content_hash
+
+    # atomic so that a row marked geometry_pending is only visible to the worker once the post_save
+    # signal has moved import_file to its final path
+    @transaction.atomic
     def save(self, *args, **kwargs):
         self.full_clean()
         if self._polygon_from_file:
-            self.polygon = self._polygon_from_file.geos
+            self.polygon = self._polygon_from_file
+        update_fields = kwargs.get("update_fields")
+        # edits that leave polygon and point as loaded skip the (overlay-heavy) recomputation
+        geometry_changed = (
+            update_fields is None or set(self.SOURCE_GEOMETRY_FIELDS) & set(update_fields)
+        ) and self.geometry_changed()
         super().save(*args, **kwargs)
 
+        if geometry_changed:
+            queryset = ManagementArea.objects.filter(pk=self.pk)
+            queryset.update_derived_geometries()
+            queryset.update_spatial_relations()
+            self.refresh_from_db(fields=self.DERIVED_GEOMETRY_FIELDS)
+
     class Meta:
         verbose_name = _("management area")
         ordering = ["name", "date_established"]
@@ -104,6 +312,41 @@ class ManagementArea(BaseModel):
         return f"{self.name} [{self.version_date}]{_countries}"
 
 
+class ManagementAreaRelation(models.Model):
+    """
+    How a management area's polygon relates to another's, computed by ManagementAreaQuerySet.update_spatial_relations
+    on save and by the `compute_spatial_relations` command. Each pair is stored in both directions.
+    """
+
+    WITHIN = "within"
+    CONTAINS = "contains"
+    OVERLAPS = "overlaps"
+    RELATIONS = (
+        (WITHIN, _(WITHIN)),
+        (CONTAINS, _(CONTAINS)),
+        (OVERLAPS, _(OVERLAPS)),
+    )
+
+    management_area = models.ForeignKey(
+        ManagementArea, on_delete=models.CASCADE, related_name="spatial_relations"
+    )
+    related = models.ForeignKey(
+        ManagementArea, on_delete=models.CASCADE, related_name="+"
+    )
+    relation = models.CharField(max_length=20, choices=RELATIONS)
+    # share of each area's geodesic area that lies within the other
+    overlap_ratio = models.FloatField(null=True, blank=True)
+    related_overlap_ratio = models.FloatField(null=True, blank=True)
+    computed_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("management area relation")
+        unique_together = ("management_area", "related")
+
+    def __str__(self):
+        return f"{self.management_area_id} {self.relation} {self.related_id}"
+
+
 class ManagementAreaZone(BaseModel):
     OPEN_ACCESS = 90
     PARTIALLY_RESTRICTED = 50
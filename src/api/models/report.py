@@ -0,0 +1,68 @@
+import hashlib
+import uuid
+from django.contrib.gis.db import models
+from django.utils.translation import gettext_lazy as _
+
+from .base import BaseModel
+
+
+def report_export_path(instance, filename):
+    # random segment so stored artifacts (which may include private assessments) aren't guessable
+    return f"{type(instance).__name__}/{instance.pk}/{uuid.uuid4().hex}/{filename}"
+
+
+class ReportExport(BaseModel):
+    PENDING = 10
+    RUNNING = 20
+    COMPLETE = 30
+    FAILED = 40
+    STATUSES = (
+        (PENDING, _("pending")),
+        (RUNNING, _("running")),
+        (COMPLETE, _("complete")),
+        (FAILED, _("failed")),
+    )
+
+    ASSESSMENTS = "assessments"
+    REPORTS = ((ASSESSMENTS, _(ASSESSMENTS)),)
+
+    CSV = "csv"
+    GEOJSON = "geojson"
+    FLATGEOBUF = "fgb"
+    FILETYPES = ((CSV, "CSV"), (GEOJSON, "GeoJSON"), (FLATGEOBUF, "FlatGeobuf"))
+
+    report = models.CharField(max_length=50, choices=REPORTS)
+    filetype = models.CharField(max_length=20, choices=FILETYPES)
+    language = models.CharField(max_length=15, blank=True)
+    # report filters as a normalized (sorted) query string
+    query = models.TextField(blank=True)
+    query_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    status = models.PositiveSmallIntegerField(choices=STATUSES, default=PENDING)
+    data_generation = models.CharField(max_length=255, blank=True, editable=False)
+    file = models.FileField(upload_to=report_export_path, blank=True, null=True)
+    error = models.TextField(blank=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    completed_on = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def make_query_hash(report, filetype, language, query, user=None):
+        # Report visibility depends on the requesting user, so artifacts are only shared within the same scope
+        scope = "public"
+        if user is not None and user.is_authenticated:
+            scope = "all" if user.is_superuser else f"user:{user.pk}"
+        key = "|".join([report, filetype, language, query, scope])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        if not self.query_hash:
+            self.query_hash = self.make_query_hash(
+                self.report, self.filetype, self.language, self.query, self.created_by
+            )
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = _("report export")
+        ordering = ["-created_on"]
+
+    def __str__(self):
+        return f"{self.report} {self.filetype} [{self.get_status_display()}]"
@@ -1,7 +1,14 @@
 from .base import BaseReport
+from .arrow_report import ArrowReport, ParquetReport
 from .csv_report import CSVReport
+from .flatgeobuf_report import FlatGeobufReport
+from .xlsx_report import XLSXReport
 
 __all__ = [
+    "ArrowReport",
     "BaseReport",
     "CSVReport",
+    "FlatGeobufReport",
+    "ParquetReport",
+    "XLSXReport",
 ]
@@ -0,0 +1,134 @@
+import io
+import re
+from datetime import date, datetime
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.parquet as pq
+from . import BaseReport
+
+
+LIST_TYPE = re.compile(r"list<(.+)>")
+DECIMAL_TYPE = re.compile(r"decimal128\((\d+), ?(\d+)\)")
+TIMESTAMP_TYPE = re.compile(r"timestamp\[(\w+), ?tz=(.+)\]")
+
+
+def arrow_type(type_name):
+    """Resolve a type name such as "int8", "date32" or "list<string>" to a pyarrow DataType."""
+    match = LIST_TYPE.fullmatch(type_name)
+    if match:
+        return pa.list_(arrow_type(match.group(1)))
+    match = DECIMAL_TYPE.fullmatch(type_name)
+    if match:
+        return pa.decimal128(int(match.group(1)), int(match.group(2)))
+    match = TIMESTAMP_TYPE.fullmatch(type_name)
+    if match:
+        return pa.timestamp(match.group(1), tz=match.group(2))
+    return pa.type_for_alias(type_name)
+
+
+class StreamSink(io.RawIOBase):
+    """
+    Write-only file object that keeps written bytes until drained. tell() keeps counting across drains
+    because arrow writers use it to record offsets (e.g. of parquet row groups in the footer).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ArrowReport(BaseReport):
+    """Arrow IPC streaming format, written as typed record batches as data is consumed."""
+
+    batch_size = 5000
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def __init__(self, schema, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.schema = schema
+
+    # noinspection PyMethodMayBeStatic
+    def _coerce(self, value, field_type):
+        if value is None:
+            return None
+        if pa.types.is_list(field_type):
+            values = value if isinstance(value, (list, set, tuple)) else [value]
+            return [self._coerce(v, field_type.value_type) for v in values]
+        if pa.types.is_string(field_type):
+            if isinstance(value, (list, set, tuple)):
+                return ",".join([str(e) for e in value])
+            return str(value)
+        if pa.types.is_date(field_type) and isinstance(value, str):
+            return date.fromisoformat(value)
+        if pa.types.is_timestamp(field_type) and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        if pa.types.is_decimal(field_type):
+            return Decimal(value)
+        if pa.types.is_integer(field_type):
+            return int(value)
+        if pa.types.is_floating(field_type):
+            return float(value)
+        return value
+
+    def _record_batch(self, records):
+        columns = []
+        for field in self.schema:
+            values = [self._coerce(r.get(field.name), field.type) for r in records]
+            columns.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(columns, schema=self.schema)
+
+    def batches(self, data):
+        records = []
+        for record in data:
+            records.append(record)
+            if len(records) >= self.batch_size:
+                yield self._record_batch(records)
+                records = []
+        if records:
+            yield self._record_batch(records)
+
+    def get_writer(self, sink):
+        return pa.ipc.new_stream(sink, self.schema)
+
+    def stream(self, data, *args, **kwargs):
+        sink = StreamSink()
+        writer = self.get_writer(sink)
+        for batch in self.batches(data):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    def generate(self, path, data, *args, **kwargs):
+        with open(path, "wb") as f:
+            for chunk in self.stream(data):
+                f.write(chunk)
+
+
+class ParquetReport(ArrowReport):
+    """Parquet, one row group per record batch; parquet is written sequentially, so it can be streamed too."""
+
+    batch_size = 20000
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def get_writer(self, sink):
+        return pq.ParquetWriter(sink, self.schema, compression="zstd")
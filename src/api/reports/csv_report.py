@@ -1,16 +1,13 @@
 import csv
+import io
 from . import BaseReport
 
 
-class Echo(object):
-    """An object that implements just the write method of the file-like interface."""
-
-    def write(self, value):
-        """Write the value by returning it, instead of storing in a buffer."""
-        return value
-
-
 class CSVReport(BaseReport):
+    # rows are accumulated until the buffer reaches this many characters, then yielded as one chunk
+    buffer_size = 65536
+    encoding = "utf-8"
+
     def _flatten_record(self, record_dict):
         for k, v in record_dict.items():
             if isinstance(v, (list, set, tuple)):
@@ -23,10 +20,17 @@ class CSVReport(BaseReport):
     def _apply_formatters(self, flat_record):
         return self._flatten_record(flat_record)
 
+    def _flush(self, csv_buffer):
+        chunk = csv_buffer.getvalue().encode(self.encoding)
+        csv_buffer.seek(0)
+        csv_buffer.truncate()
+        return chunk
+
     def stream(self, fields, data, *args, **kwargs):
         if data is None:
-            yield ""
-        csv_buffer = Echo()
+            yield b""
+            return
+        csv_buffer = io.StringIO()
         csv_writer = csv.DictWriter(
             csv_buffer,
             fieldnames=fields,
@@ -34,18 +38,16 @@ class CSVReport(BaseReport):
             quoting=csv.QUOTE_NONNUMERIC,
         )
 
-        yield csv_buffer.write(f"{','.join(fields)}\n")
+        csv_buffer.write(f"{','.join(fields)}\n")
         for flat_record in data:
-            yield csv_writer.writerow(self._apply_formatters(flat_record))
+            csv_writer.writerow(self._apply_formatters(flat_record))
+            if csv_buffer.tell() >= self.buffer_size:
+                yield self._flush(csv_buffer)
+
+        if csv_buffer.tell():
+            yield self._flush(csv_buffer)
 
     def generate(self, path, fields, data, *args, **kwargs):
         with open(path, "wb") as csvfile:
-            csv_writer = csv.DictWriter(
-                csvfile,
-                fieldnames=fields,
-                extrasaction="ignore",
-                quoting=csv.QUOTE_NONNUMERIC,
-            )
-            csv_writer.writeheader()
-            for flat_record in data:
-                csv_writer.writerow(self._apply_formatters(flat_record))
+            for chunk in self.stream(fields, data):
+                csvfile.write(chunk)
@@ -1,7 +1,7 @@
-import io
 from datetime import datetime
 from django.conf import settings
-from django.http import FileResponse
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import translation
 from django_countries import countries
 from django_countries.serializers import CountryFieldMixin
 from django_filters import (
@@ -10,17 +10,18 @@ from django_filters import (
     ModelChoiceFilter,
     NumberFilter,
 )
-from pathlib import Path
 from rest_framework import serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from tempfile import TemporaryDirectory
+from rest_framework.throttling import UserRateThrottle
+from tempfile import SpooledTemporaryFile
 from zipfile import BadZipFile
 
 from .base import (
     BaseAPISerializer,
     BaseAPIFilterSet,
     BaseAPIViewSet,
+    management_area_choice_qs,
     user_choice_qs,
     PrimaryKeyExpandedField,
     ReadOnlyChoiceSerializer,
@@ -34,6 +35,7 @@ from ..ingest import (
     UNSUPPORTED_ZIP,
     INVALID_ZIP,
 )
+from ..ingest.bulk import import_workbooks, stream_workbooks
 from ..ingest.xlsx import AssessmentXLSX
 from ..models import (
     Assessment,
@@ -44,12 +46,13 @@ from ..models import (
     Organization,
 )
 from ..permissions import (
+    AuthenticatedAndReadOnly,
     ReadOnly,
     ReadOnlyOrAuthenticatedCreate,
     AssessmentReadOnlyOrAuthenticatedUserPermission,
     CollaboratorReadOnlyOrAuthenticatedUserPermission,
 )
-from ..utils import truthy, unzip_file
+from ..utils import open_zip, truthy
 from ..utils.assessment import (
     assessment_score,
     assessment_xlsx_has_errors,
@@ -132,10 +135,12 @@ class AssessmentSerializer(BaseAPISerializer):
     class Meta:
         model = Assessment
         exclude = []
+        extra_kwargs = {"management_area": {"queryset": management_area_choice_qs}}
 
 
 class AssessmentFilterSet(BaseAPIFilterSet):
     person_responsible = ModelChoiceFilter(queryset=user_choice_qs)
+    management_area = ModelChoiceFilter(queryset=management_area_choice_qs)
     # actual management_area__countries field is varchar like "US,AX,ES"
     # Filter depends on lookup_expr="icontains" with field storing unique 2-character country codes
     management_area_countries = ChoiceFilter(
@@ -150,6 +155,29 @@ class AssessmentFilterSet(BaseAPIFilterSet):
         exclude = ["management_plan_file"]
 
 
+class XLSXBulkRateThrottle(UserRateThrottle):
+    # bulk workbook imports and exports occupy a request worker and the shared xlsx process pool
+    scope = "xlsx_bulk"
+
+
+def get_upload_error(uploaded_file, supported_mime_types, maximum_filesize):
+    if uploaded_file is None:
+        return ingest_400(MISSING_FILE, "missing file")
+    if uploaded_file.content_type not in supported_mime_types:
+        return ingest_400(
+            UNSUPPORTED_FILE_TYPE,
+            f"file type not supported; supported types: {', '.join(supported_mime_types)}",
+            {"supported_mime_types": supported_mime_types},
+        )
+    if uploaded_file.size > maximum_filesize:
+        return ingest_400(
+            FILE_TOO_LARGE,
+            f"uploaded file larger than {maximum_filesize}",
+            {"maximum_filesize": maximum_filesize},
+        )
+    return None
+
+
 class AssessmentViewSet(BaseAPIViewSet):
     ordering = ["name", "year"]
     serializer_class = AssessmentSerializer
@@ -158,9 +186,12 @@ class AssessmentViewSet(BaseAPIViewSet):
     permission_classes = [AssessmentReadOnlyOrAuthenticatedUserPermission]
 
     def get_queryset(self):
-        return get_assessment_related_queryset(
-            self.request.user, Assessment
-        ).prefetch_related("assessment_flags")
+        return (
+            get_assessment_related_queryset(self.request.user, Assessment)
+            .select_related("management_area")
+            .defer(*ManagementArea.geometry_fields("management_area"))
+            .prefetch_related("assessment_flags")
+        )
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -184,17 +215,18 @@ class AssessmentViewSet(BaseAPIViewSet):
         assessment_xlsx = AssessmentXLSX(assessment)
 
         if request.method == "GET":
-            assessment_xlsx.generate_from_assessment()
-            response_file = io.BytesIO()
+            assessment_xlsx.generate_from_template()
+            # small workbooks stay in memory, larger ones roll over to disk; closed by FileResponse
+            response_file = SpooledTemporaryFile(max_size=settings.XLSX_SPOOL_MAX_SIZE)
             assessment_xlsx.workbook.save(response_file)
+            content_length = response_file.tell()
             response_file.seek(0)
             response = FileResponse(
                 response_file, content_type=settings.EXCEL_MIME_TYPES[0]
             )
-            response["Content-Length"] = len(response_file.getvalue())
-            date_string = str(datetime.now().date().isoformat())
-            filename = f"elinor-assessment-{assessment.pk}_{date_string}"
-            response["Content-Disposition"] = f'attachment; filename="{filename}.xlsx"'
+            response["Content-Length"] = content_length
+            filename = assessment_xlsx.get_filename()
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
             return response
 
         if request.method == "POST":
@@ -203,51 +235,38 @@ class AssessmentViewSet(BaseAPIViewSet):
             dryrun = truthy(request.data.get("dryrun"))
             supported_mime_types = settings.EXCEL_MIME_TYPES + settings.ZIP_MIME_TYPES
 
-            if uploaded_file is None:
-                error = ingest_400(MISSING_FILE, "missing file")
-                return Response(error, status=status.HTTP_400_BAD_REQUEST)
-            content_type = uploaded_file.content_type
-            if content_type not in supported_mime_types:
-                error = ingest_400(
-                    UNSUPPORTED_FILE_TYPE,
-                    f"file type not supported; supported types: {', '.join(supported_mime_types)}",
-                    {"supported_mime_types": supported_mime_types},
-                )
-                return Response(error, status=status.HTTP_400_BAD_REQUEST)
             maximum_filesize = 10485760  # 10MB
-            if uploaded_file.size > maximum_filesize:
-                error = ingest_400(
-                    FILE_TOO_LARGE,
-                    f"uploaded file larger than {maximum_filesize}",
-                    {"maximum_filesize": maximum_filesize},
-                )
+            error = get_upload_error(uploaded_file, supported_mime_types, maximum_filesize)
+            if error:
                 return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-            if content_type in settings.ZIP_MIME_TYPES:
-                with TemporaryDirectory() as tempdir:
-                    temppath = Path(tempdir)
-                    try:
-                        dirs, files = unzip_file(uploaded_file, temppath)
-                        if len(files) != 1:
-                            error = ingest_400(
-                                UNSUPPORTED_ZIP,
-                                "zip file contains more than one file, or is empty",
-                                {"num_files": len(files)},
-                            )
-                            return Response(error, status=status.HTTP_400_BAD_REQUEST)
-                    except BadZipFile as e:
-                        error = ingest_400(INVALID_ZIP, str(e))
-                        return Response(error, status=status.HTTP_400_BAD_REQUEST)
-
-                    with open(files[0], "rb") as f:
-                        xlsxfile = io.BytesIO(f.read())
+            if uploaded_file.content_type in settings.ZIP_MIME_TYPES:
+                try:
+                    zf = open_zip(uploaded_file)
+                except BadZipFile as e:
+                    error = ingest_400(INVALID_ZIP, str(e))
+                    return Response(error, status=status.HTTP_400_BAD_REQUEST)
+                files = [
+                    info
+                    for info in zf.infolist()
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                ]
+                if len(files) != 1:
+                    error = ingest_400(
+                        UNSUPPORTED_ZIP,
+                        "zip file contains more than one file, or is empty",
+                        {"num_files": len(files)},
+                    )
+                    return Response(error, status=status.HTTP_400_BAD_REQUEST)
+                # read in place from the archive rather than extracted
+                xlsxfile = zf.open(files[0])
 
             assessment_xlsx.load_from_file(xlsxfile)
             if assessment_xlsx_has_errors(assessment_xlsx):
                 return Response(
                     assessment_xlsx.validations, status=status.HTTP_400_BAD_REQUEST
                 )
-            assessment_xlsx.submit_answers(dryrun=dryrun)
+            assessment_xlsx.submit_answers(dryrun=dryrun, user=request.user)
             if assessment_xlsx_has_errors(assessment_xlsx):
                 return Response(
                     assessment_xlsx.validations, status=status.HTTP_400_BAD_REQUEST
@@ -255,6 +274,52 @@ class AssessmentViewSet(BaseAPIViewSet):
 
             return Response("Success", status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["POST"], throttle_classes=[XLSXBulkRateThrottle])
+    def xlsx_bulk(self, request, *args, **kwargs):
+        # a zip of workbooks downloaded from the xlsx action, each routed by the assessment id in its title cell
+        uploaded_file = request.FILES.get("file")
+        dryrun = truthy(request.data.get("dryrun"))
+        error = get_upload_error(uploaded_file, settings.ZIP_MIME_TYPES, settings.ZIP_MAX_SIZE)
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            zf = open_zip(uploaded_file)
+        except BadZipFile as e:
+            error = ingest_400(INVALID_ZIP, str(e))
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        report, has_errors = import_workbooks(zf, request.user, dryrun=dryrun)
+        # once any workbook is saved the import has (partly) happened; the report lists the files that failed
+        saved = any(result["saved"] for result in report.values())
+        response_status = status.HTTP_400_BAD_REQUEST if has_errors and not saved else status.HTTP_200_OK
+        return Response(report, status=response_status)
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        permission_classes=[AuthenticatedAndReadOnly],
+        throttle_classes=[XLSXBulkRateThrottle],
+    )
+    def xlsx_bundle(self, request, *args, **kwargs):
+        # the xlsx workbook of each filtered assessment, zipped; limited to what xlsx_bulk accepts back
+        queryset = self.filter_queryset(self.get_queryset())
+        assessment_ids = list(queryset.values_list("pk", flat=True)[: settings.ZIP_MAX_MEMBERS + 1])
+        if len(assessment_ids) > settings.ZIP_MAX_MEMBERS:
+            raise serializers.ValidationError(
+                {"detail": [f"more than {settings.ZIP_MAX_MEMBERS} assessments; narrow the filters"]}
+            )
+        lang = translation.get_language()
+
+        # the response is consumed after the view returns, so pin the request language for the questions
+        def stream():
+            with translation.override(lang):
+                yield from stream_workbooks(assessment_ids, lang)
+
+        response = StreamingHttpResponse(stream(), content_type=settings.ZIP_MIME_TYPES[0])
+        date_string = str(datetime.now().date().isoformat())
+        response["Content-Disposition"] = f'attachment; filename="elinor-assessments_{date_string}.zip"'
+        return response
+
 
 class AssessmentChangeSerializer(BaseAPISerializer):
     event_type = serializers.SerializerMethodField()
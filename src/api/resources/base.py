@@ -1,8 +1,15 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
 from collections import OrderedDict
+from datetime import date, datetime, time
+from decimal import Decimal
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point, Polygon
 from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
 from django.db import IntegrityError
+from django.db.models import F, Q
 from django_countries import countries
 from django_countries.serializers import CountryFieldMixin
 from django_filters import (
@@ -20,12 +27,13 @@ from rest_framework.decorators import (
     authentication_classes,
     permission_classes,
 )
-from rest_framework.exceptions import MethodNotAllowed
-from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import MethodNotAllowed, NotFound
+from rest_framework.filters import BaseFilterBackend, OrderingFilter, SearchFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_gis.fields import GeometryField
 from ..models import (
     ActiveLanguage,
@@ -47,6 +55,7 @@ from ..permissions import (
     ReadOnlyOrAuthenticatedCreate,
 )
 from ..utils import get_m2m_fields, truthy
+from ..utils.spatial import BoundingBoxDistance, forbid_geometry_fetch
 
 try:
     from allauth.account.utils import send_email_confirmation, setup_user_email
@@ -57,6 +66,8 @@ except ImportError:
 
 User = get_user_model()
 user_choice_qs = User.objects.order_by("username")
+# for related fields and filters on management areas, which only look up the row and never output its geometry
+management_area_choice_qs = ManagementArea.objects.defer_geometry()
 
 
 @api_view(permissions.SAFE_METHODS)
@@ -82,7 +93,198 @@ class ElinorDefaultRouter(routers.DefaultRouter):
         return self.APIRootView.as_view(api_root_dict=api_root_dict)
 
 
-class StandardResultPagination(PageNumberPagination):
+def _position_default(value):
+    # DjangoJSONEncoder truncates microseconds, which would break comparisons against datetime positions
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode cursor position value {value!r}")
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination: instead of OFFSET/LIMIT plus COUNT(*), each page is fetched with a WHERE
+    clause positioned after the last row of the previous page, using the DefaultOrderingFilter ordering
+    (which always ends with an "id" tiebreak, so positions are unique). Ordering values are annotated onto the
+    queryset so that related lookups and FKs compare on the same columns they are sorted by.
+    Cursors are opaque urlsafe base64-encoded JSON: {"p": [position values], "r": reverse}.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = 1000
+    position_prefix = "_keyset_"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.reverse, self.position = self.decode_cursor(request)
+
+        ordering = self.get_ordering(request, queryset, view)
+        if self.position is not None and len(self.position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        self.aliases = [f"{self.position_prefix}{i}" for i in range(len(ordering))]
+        # effective direction of each ordering term for this page: reversed pages walk backwards
+        self.descending = [o.startswith("-") != self.reverse for o in ordering]
+
+        queryset = queryset.annotate(
+            **{alias: F(o.lstrip("-")) for alias, o in zip(self.aliases, ordering)}
+        )
+        if self.position is not None:
+            queryset = queryset.filter(self.get_position_filter(self.position))
+        queryset = queryset.order_by(
+            *[
+                f"-{alias}" if desc else alias
+                for alias, desc in zip(self.aliases, self.descending)
+            ]
+        )
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_following = len(results) > self.page_size
+        results = results[: self.page_size]
+        if self.reverse:
+            results.reverse()
+        self.results = results
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, DefaultOrderingFilter):
+                return backend().get_ordering(request, queryset, view)
+        return ["id"]
+
+    def _after(self, alias, value, descending):
+        # Postgres sorts NULLs last ascending and first descending; None means no row can follow
+        if descending:
+            if value is None:
+                return Q(**{f"{alias}__isnull": False})
+            return Q(**{f"{alias}__lt": value})
+        if value is None:
+            return None
+        return Q(**{f"{alias}__gt": value}) | Q(**{f"{alias}__isnull": True})
+
+    # noinspection PyMethodMayBeStatic
+    def _equal(self, alias, value):
+        if value is None:
+            return Q(**{f"{alias}__isnull": True})
+        return Q(**{alias: value})
+
+    def get_position_filter(self, position):
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND id > z) ...
+        position_filter = Q(pk__in=[])
+        equal = Q()
+        for alias, value, desc in zip(self.aliases, position, self.descending):
+            after = self._after(alias, value, desc)
+            if after is not None:
+                position_filter |= equal & after
+            equal &= self._equal(alias, value)
+        return position_filter
+
+    def get_position(self, instance):
+        return [getattr(instance, alias) for alias in self.aliases]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            cursor = json.loads(urlsafe_b64decode(f"{encoded}{padding}".encode("ascii")))
+            position = cursor["p"]
+            reverse = bool(cursor.get("r"))
+            if not isinstance(position, list):
+                raise ValueError(position)
+        except (BinasciiError, KeyError, TypeError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def encode_cursor(self, position, reverse=False):
+        cursor = {"p": position}
+        if reverse:
+            cursor["r"] = 1
+        encoded = urlsafe_b64encode(
+            json.dumps(cursor, default=_position_default, separators=(",", ":")).encode()
+        ).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.rstrip("=")
+        )
+
+    def get_next_link(self):
+        if not self.reverse and not self.has_following:
+            return None
+        if self.results:
+            return self.encode_cursor(self.get_position(self.results[-1]))
+        return self.encode_cursor(self.position)
+
+    def get_previous_link(self):
+        if self.reverse and not self.has_following:
+            return None
+        if self.position is None:
+            return None
+        if self.results:
+            return self.encode_cursor(self.get_position(self.results[0]), reverse=True)
+        return self.encode_cursor(self.position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class OptionalKeysetPaginationMixin:
+    """
+    Switches a page number paginator to KeysetPagination when the cursor query param is present
+    (an empty `?cursor=` starts from the first page), skipping the COUNT(*) and deep OFFSETs.
+    """
+
+    keyset_pagination_class = KeysetPagination
+    keyset_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        if self.keyset_pagination_class.cursor_query_param in request.query_params:
+            self.keyset_paginator = self.keyset_pagination_class()
+            self.keyset_paginator.page_size = self.page_size
+            self.keyset_paginator.page_size_query_param = self.page_size_query_param
+            self.keyset_paginator.max_page_size = self.max_page_size
+            return self.keyset_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.get_keyset_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_keyset_paginated_response(self, data):
+        return self.keyset_paginator.get_paginated_response(data)
+
+
+class StandardResultPagination(OptionalKeysetPaginationMixin, PageNumberPagination):
     page_size = 100
     page_size_query_param = "limit"
     max_page_size = 1000
@@ -246,9 +448,78 @@ class DefaultOrderingFilter(OrderingFilter):
         return ordering
 
 
+class SpatialFilter(BaseFilterBackend):
+    """
+    ?bbox=minx,miny,maxx,maxy keeps rows whose view.bbox_fields overlap the box by bounding box (`&&`), answered
+    from the GiST indexes alone. ?near=lon,lat orders rows nearest first by view.near_field (`<->`, a KNN index scan),
+    replacing any other ordering; with ?k=N only the nearest N are kept. Only page number pagination applies to ?near.
+    """
+
+    max_k = 1000
+
+    # noinspection PyMethodMayBeStatic
+    def get_coordinates(self, param, value, count):
+        try:
+            coordinates = [float(c) for c in value.split(",")]
+        except ValueError:
+            coordinates = []
+        if len(coordinates) != count:
+            raise ValidationError({param: [f"Enter {count} comma-separated numbers"]})
+        return coordinates
+
+    def get_k(self, value):
+        try:
+            k = int(value)
+        except ValueError:
+            k = 0
+        if not 1 <= k <= self.max_k:
+            raise ValidationError({"k": [f"Enter a whole number from 1 to {self.max_k}"]})
+        return k
+
+    def filter_queryset(self, request, queryset, view):
+        bbox = request.query_params.get("bbox")
+        bbox_fields = getattr(view, "bbox_fields", [])
+        if bbox and bbox_fields:
+            minx, miny, maxx, maxy = self.get_coordinates("bbox", bbox, 4)
+            if minx > maxx or miny > maxy:
+                raise ValidationError({"bbox": ["Enter minx,miny,maxx,maxy with each min <= max"]})
+            box = Polygon.from_bbox((minx, miny, maxx, maxy))
+            box.srid = 4326
+            overlaps = Q()
+            for field in bbox_fields:
+                overlaps |= Q(**{f"{field}__bboverlaps": box})
+            queryset = queryset.filter(overlaps)
+
+        near = request.query_params.get("near")
+        near_field = getattr(view, "near_field", None)
+        if near and near_field:
+            if KeysetPagination.cursor_query_param in request.query_params:
+                # keyset pages are positioned on the DefaultOrderingFilter ordering, not distance
+                raise ValidationError({"near": ["Not supported with cursor pagination"]})
+            point = Point(*self.get_coordinates("near", near, 2), srid=4326)
+            distance = BoundingBoxDistance(near_field, point)
+            k = request.query_params.get("k")
+            if k is not None:
+                nearest = queryset.order_by(distance).values("pk")[: self.get_k(k)]
+                queryset = queryset.filter(pk__in=nearest)
+            # ordered by the expression rather than an annotation, which would select the geometry column; the
+            # view's queryset must not be DISTINCT, or the expression is selected and every row sorted
+            queryset = queryset.order_by(distance, "id")
+        return queryset
+
+
 class BaseAPIViewSet(viewsets.ModelViewSet):
     pagination_class = StandardResultPagination
     filter_backends = (DjangoFilterBackend, DefaultOrderingFilter, SearchFilter)
+    # actions that output geometry; all others are expected to defer geometry columns
+    geometry_actions = []
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, "action_map", {}).get(request.method.lower())
+        if settings.GEOMETRY_FETCH_GUARD and action not in self.geometry_actions:
+            with forbid_geometry_fetch():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
 
 
 class BaseChoiceViewSet(BaseAPIViewSet):
@@ -565,7 +836,7 @@ def countries_view(request):
 
     used_in_mas = truthy(request.query_params.get("used_in_mas"))
     if used_in_mas:
-        management_areas = ManagementArea.objects.all()
+        management_areas = ManagementArea.objects.only("countries")
         country_codes = set()
         for ma in management_areas:
             country_codes.update(ma.countries)
@@ -1,15 +1,24 @@
 import itertools
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import AsGeoJSON
 from django.contrib.gis.geos import GEOSGeometry
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django_countries.fields import Country
 from django_countries.serializers import CountryFieldMixin
 from django_filters import (
     CharFilter,
     ChoiceFilter,
     DateFromToRangeFilter,
+    ModelChoiceFilter,
     RangeFilter,
 )
+from rest_framework import serializers
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework_gis.filters import GeometryFilter
 from .base import (
@@ -20,11 +29,14 @@ from .base import (
     PointFieldValidated,
     PrimaryKeyExpandedField,
     ReadOnlyChoiceSerializer,
+    SpatialFilter,
+    management_area_choice_qs,
 )
 from ..models import (
     Assessment,
     GovernanceType,
     ManagementArea,
+    ManagementAreaRelation,
     ManagementAreaZone,
     ManagementAuthority,
     ProtectedArea,
@@ -32,7 +44,79 @@ from ..models import (
     StakeholderGroup,
     SupportSource,
 )
+from .reports import GeoJSONTextField, RawGeoJSON, dumps_feature, get_flatgeobuf_response
 from ..permissions import AssessmentReadOnlyOrAuthenticatedUserPermission
+from ..utils.assessment import DATA_GENERATION, bump_generation
+from ..utils.management import get_multipolygon_from_zip
+
+
+GEOMETRY_NONE = "none"
+GEOMETRY_BBOX = "bbox"
+GEOMETRY_CENTROID = "centroid"
+GEOMETRY_SIMPLIFIED = "simplified"
+GEOMETRY_FULL = "full"
+# ?geometry= option: geometry fields output by ManagementAreaSerializer
+GEOMETRY_OUTPUTS = {
+    GEOMETRY_NONE: [],
+    GEOMETRY_BBOX: ["bbox", "point"],
+    GEOMETRY_CENTROID: ["centroid"],
+    GEOMETRY_SIMPLIFIED: ["polygon", "point", "bbox", "centroid"],
+    GEOMETRY_FULL: ["polygon", "point", "bbox", "centroid"],
+}
+MAX_PRECISION = 15
+
+
+def process_geometry_import():
+    """
+    Parse the import file of one management area marked geometry_pending and store the polygon (or the error).
+    The row stays locked until done, so a worker that dies leaves it pending for the next one.
+    :return: the processed management area, or None if none are pending
+    """
+    with transaction.atomic():
+        management_area = (
+            ManagementArea.objects.select_for_update(skip_locked=True)
+            .defer_geometry()
+            .filter(geometry_pending=True)
+            .order_by("updated_on")
+            .first()
+        )
+        if management_area is None:
+            return None
+
+        polygon = None
+        error = ""
+        try:
+            with management_area.import_file.open("rb") as import_file:
+                polygon = get_multipolygon_from_zip("import_file", import_file)
+        except ValidationError as e:
+            error = " ".join(e.messages)
+        except Exception as e:
+            error = str(e)
+
+        queryset = ManagementArea.objects.filter(pk=management_area.pk)
+        # updated_on moves data_generation(), so report exports are rebuilt; update() sends no signals, so
+        # cached tiles and clusters are invalidated below
+        updates = {
+            "geometry_pending": False,
+            "geometry_import_error": error,
+            "updated_on": timezone.now(),
+        }
+        if polygon is not None:
+            updates["polygon"] = polygon
+        queryset.update(**updates)
+        if polygon is not None:
+            queryset.update_derived_geometries()
+            queryset.update_spatial_relations()
+        bump_generation(DATA_GENERATION)
+    return management_area
+
+
+def get_simplify(request):
+    simplify = request.query_params.get("simplify") or ManagementArea.SIMPLIFY_FULL
+    if simplify not in ManagementArea.SIMPLIFICATIONS:
+        choices = ", ".join(ManagementArea.SIMPLIFICATIONS)
+        raise serializers.ValidationError({"simplify": [f"Choose one of: {choices}"]})
+    return simplify
 
 
 class ManagementAreaSerializer(CountryFieldMixin, BaseAPISerializer):
@@ -75,7 +159,7 @@ class ManagementAreaSerializer(CountryFieldMixin, BaseAPISerializer):
         serializer=ReadOnlyChoiceSerializer,
     )
     containedby = PrimaryKeyExpandedField(
-        queryset=ManagementArea.objects.all(),
+        queryset=management_area_choice_qs,
         allow_null=True,
         required=False,
         serializer=ReadOnlyChoiceSerializer,
@@ -88,36 +172,156 @@ class ManagementAreaSerializer(CountryFieldMixin, BaseAPISerializer):
             self.validated_data["countries"] = unique_countries
         return super().save(**kwargs)
 
+    def get_fields(self):
+        fields = super().get_fields()
+        geometry_fields = self.context.get("geometry_fields")
+        if geometry_fields is not None:
+            # read-only output of GeoJSON rendered in SQL; see ManagementAreaViewSet.get_geometry_columns
+            for fieldname in GEOMETRY_OUTPUTS[GEOMETRY_FULL]:
+                fields.pop(fieldname, None)
+            for fieldname in geometry_fields:
+                fields[fieldname] = GeoJSONTextField(source=f"{fieldname}_geojson")
+        return fields
+
     class Meta:
         model = ManagementArea
-        exclude = []
+        exclude = ["polygon_low", "polygon_medium"]
+        extra_kwargs = {"parent": {"queryset": management_area_choice_qs}}
+
+
+class ManagementAreaRelationSerializer(serializers.ModelSerializer):
+    related = ReadOnlyChoiceSerializer()
+
+    class Meta:
+        model = ManagementAreaRelation
+        fields = [
+            "related",
+            "relation",
+            "overlap_ratio",
+            "related_overlap_ratio",
+            "computed_on",
+        ]
 
 
 class ManagementAreaFilterSet(BaseAPIFilterSet):
     date_established = DateFromToRangeFilter()
     version_date = DateFromToRangeFilter()
     reported_size = RangeFilter()
+    geodesic_area = RangeFilter()
     intersects_polygon = GeometryFilter(field_name="polygon", lookup_expr="intersects")
     recognition_level = CharFilter(lookup_expr="icontains")
     assessment_data_policy = ChoiceFilter(
         choices=Assessment.DATA_POLICIES,
         field_name="assessment__data_policy",
     )
+    parent = ModelChoiceFilter(queryset=management_area_choice_qs)
+    containedby = ModelChoiceFilter(queryset=management_area_choice_qs)
 
     class Meta:
         model = ManagementArea
-        exclude = ["geospatial_sources", "import_file", "map_image", "polygon", "point"]
+        exclude = [
+            "geospatial_sources",
+            "geometry_import_error",
+            "import_file",
+            "map_image",
+            "polygon",
+            "point",
+            "polygon_low",
+            "polygon_medium",
+            "bbox",
+            "centroid",
+            "wdpa_hash",
+        ]
 
 
 class ManagementAreaViewSet(BaseAPIViewSet):
+    flatgeobuf_fields = [
+        "id",
+        "name",
+        "wdpa_protected_area",
+        "date_established",
+        "version_date",
+        "countries",
+        "reported_size",
+        "geodesic_area",
+    ]
+    geometry_actions = [
+        "list",
+        "retrieve",
+        "create",
+        "update",
+        "partial_update",
+        "destroy",
+        "flatgeobuf",
+    ]
+    # actions serializing management areas with ?geometry output
+    geojson_actions = ["list", "retrieve"]
     ordering = ["name", "version_date"]
     serializer_class = ManagementAreaSerializer
     filterset_class = ManagementAreaFilterSet
+    filter_backends = BaseAPIViewSet.filter_backends + (SpatialFilter,)
+    bbox_fields = ["polygon", "point"]
+    near_field = "centroid"
     search_fields = ["name", "protected_area__name", "management_authority__name"]
     permission_classes = [AssessmentReadOnlyOrAuthenticatedUserPermission]
 
+    def get_geometry(self):
+        default = GEOMETRY_BBOX if self.action == "list" else GEOMETRY_FULL
+        geometry = self.request.query_params.get("geometry") or default
+        if geometry not in GEOMETRY_OUTPUTS:
+            choices = ", ".join(GEOMETRY_OUTPUTS)
+            raise serializers.ValidationError({"geometry": [f"Choose one of: {choices}"]})
+        return geometry
+
+    def get_precision(self):
+        precision = self.request.query_params.get("precision")
+        if precision is None:
+            return settings.GEO_PRECISION
+        try:
+            precision = int(precision)
+        except ValueError:
+            precision = -1
+        if not 0 <= precision <= MAX_PRECISION:
+            raise serializers.ValidationError(
+                {"precision": [f"Enter a whole number of decimal places from 0 to {MAX_PRECISION}"]}
+            )
+        return precision
+
+    def get_geometry_columns(self):
+        # {output field: column}; ?simplify picks the polygon variant, "simplified" defaulting to medium
+        geometry = self.get_geometry()
+        simplify = get_simplify(self.request)
+        if geometry == GEOMETRY_SIMPLIFIED and simplify == ManagementArea.SIMPLIFY_FULL:
+            simplify = ManagementArea.SIMPLIFY_MEDIUM
+        columns = {
+            "polygon": ManagementArea.polygon_field(simplify),
+            "point": "point",
+            "bbox": "bbox",
+            "centroid": "centroid",
+        }
+        return {fieldname: columns[fieldname] for fieldname in GEOMETRY_OUTPUTS[geometry]}
+
     def get_queryset(self):
-        return ManagementArea.objects.all()
+        queryset = ManagementArea.objects.select_related("containedby").defer(
+            *ManagementArea.geometry_fields("containedby")
+        )
+        if self.request.method in SAFE_METHODS:
+            queryset = queryset.defer_geometry()
+        if self.action in self.geojson_actions:
+            # only the requested geometry is selected, already rendered to GeoJSON at the requested precision
+            precision = self.get_precision()
+            geojson = {
+                f"{fieldname}_geojson": AsGeoJSON(column, precision=precision)
+                for fieldname, column in self.get_geometry_columns().items()
+            }
+            queryset = queryset.annotate(**geojson)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.geojson_actions:
+            context["geometry_fields"] = list(self.get_geometry_columns())
+        return context
 
     @action(methods=["GET"], detail=False)
     def countries(self, request):
@@ -136,14 +340,52 @@ class ManagementAreaViewSet(BaseAPIViewSet):
 
         return Response(response)
 
+    @action(methods=["GET"], detail=True)
+    def spatial_relations(self, request, pk=None):
+        management_area = self.get_object()
+        relations = (
+            management_area.spatial_relations.select_related("related")
+            .defer(*ManagementArea.geometry_fields("related"))
+            .order_by("relation", "-overlap_ratio")
+        )
+        serializer = ManagementAreaRelationSerializer(relations, many=True)
+        return Response(serializer.data)
+
+    def get_flatgeobuf_features(self):
+        polygon_field = ManagementArea.polygon_field(get_simplify(self.request))
+        geometry = Coalesce(polygon_field, "point", output_field=GeometryField(srid=4326))
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .annotate(geojson=AsGeoJSON(geometry, precision=self.get_precision()))
+            .values("geojson", *self.flatgeobuf_fields)
+        )
+        for row in rows.iterator(chunk_size=500):
+            geojson = row.pop("geojson")
+            yield dumps_feature(
+                {
+                    "type": "Feature",
+                    "geometry": RawGeoJSON(geojson) if geojson else None,
+                    "properties": row,
+                }
+            )
+
+    @action(methods=["GET"], detail=False)
+    def flatgeobuf(self, request):
+        return get_flatgeobuf_response(
+            self.get_flatgeobuf_features(), "managementareas", "managementareas.fgb"
+        )
+
 
 class ManagementAreaZoneSerializer(BaseAPISerializer):
     class Meta:
         model = ManagementAreaZone
         exclude = []
+        extra_kwargs = {"management_area": {"queryset": management_area_choice_qs}}
 
 
 class ManagementAreaZoneFilterSet(BaseAPIFilterSet):
+    management_area = ModelChoiceFilter(queryset=management_area_choice_qs)
+
     class Meta:
         model = ManagementAreaZone
         exclude = ["description"]
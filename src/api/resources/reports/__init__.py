@@ -1,13 +1,28 @@
+import json
+import os
 from collections import OrderedDict
 from datetime import datetime
-from django.http import StreamingHttpResponse
+from fnmatch import fnmatchcase
+from tempfile import TemporaryDirectory, TemporaryFile
+import pyarrow as pa
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import translation
 from rest_framework import serializers
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework_gis.pagination import GeoJsonPagination
-from ..base import BaseAPIViewSet
-from ...reports import CSVReport
+from ..base import BaseAPIViewSet, OptionalKeysetPaginationMixin
+from ...reports import (
+    ArrowReport,
+    CSVReport,
+    FlatGeobufReport,
+    ParquetReport,
+    XLSXReport,
+)
+from ...reports.arrow_report import arrow_type
+from ...utils import truthy
 
 
 def datetime2date(obj, fieldname):
@@ -26,11 +41,87 @@ def get_flattened(base, fielddict):
     return flattened_fields
 
 
-class BaseGeoJsonPagination(GeoJsonPagination):
+def get_serializer_field_type(field):
+    # arrow type name for a (flattened) report serializer field; method fields default to string
+    if isinstance(field, (serializers.ManyRelatedField, serializers.ListField)):
+        return "list<string>"
+    if isinstance(field, serializers.BooleanField):
+        return "bool"
+    if isinstance(field, serializers.DecimalField):
+        return f"decimal128({field.max_digits}, {field.decimal_places})"
+    if isinstance(field, serializers.IntegerField):
+        return "int64"
+    if isinstance(field, serializers.FloatField):
+        return "float64"
+    if isinstance(field, serializers.DateTimeField):
+        return "timestamp[us, tz=UTC]"
+    if isinstance(field, serializers.DateField):
+        return "date32"
+    return "string"
+
+
+def dumps_feature(feature):
+    # geometry text rendered by the database is spliced in verbatim rather than parsed and re-encoded
+    geometry = feature.pop("geometry", None)
+    if not isinstance(geometry, RawGeoJSON):
+        geometry = json.dumps(geometry, cls=JSONEncoder)
+    properties = json.dumps(feature, cls=JSONEncoder)
+    return f'{{"geometry": {geometry}, {properties[1:]}'
+
+
+def get_flatgeobuf_response(features, layer_name, file_name):
+    report = FlatGeobufReport(layer_name)
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, file_name)
+        report.generate(path, features)
+        # still readable after the directory is removed
+        fgbfile = open(path, "rb")
+
+    response = FileResponse(fgbfile, content_type=report.media_type)
+    response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+    return response
+
+
+class RawGeoJSON(str):
+    pass
+
+
+class GeoJSONTextField(serializers.Field):
+    """
+    Read-only geometry already rendered to GeoJSON text by the database (e.g. an AsGeoJSON annotation).
+    Stream writers set raw_geometry in the serializer context to get the text back untouched for dumps_feature;
+    otherwise it is parsed so the regular JSON renderer can embed it.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if value is None:
+            return None
+        if self.context.get("raw_geometry"):
+            return RawGeoJSON(value)
+        return json.loads(value)
+
+
+class BaseGeoJsonPagination(OptionalKeysetPaginationMixin, GeoJsonPagination):
     page_size = 100
     page_size_query_param = "limit"
     max_page_size = 5000
 
+    def get_keyset_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("type", "FeatureCollection"),
+                    ("next", self.keyset_paginator.get_next_link()),
+                    ("previous", self.keyset_paginator.get_previous_link()),
+                    ("features", data["features"]),
+                ]
+            )
+        )
+
 
 class BaseReportSerializer(serializers.ModelSerializer):
     created_on = serializers.SerializerMethodField()
@@ -51,9 +142,12 @@ class CSVReportMixin(BaseAPIViewSet):
     defined for the view, respecting field order and naming.
     OneToOne relationships (nested serializer without many=True) are automatically flattened.
     Custom manipulation can be specified via get_<fieldname> callable similar to SerializerMethodField appraoch.
+    Records are read from the database in chunks of report_chunk_size (with prefetches applied per chunk) and
+    serialized and flattened one at a time, so memory use does not grow with the size of the export.
     """
 
     csv_method_fields = []
+    report_chunk_size = 500
     file_prefix = ""
 
     def get_fields(self):
@@ -76,46 +170,64 @@ class CSVReportMixin(BaseAPIViewSet):
 
         return flat_fields
 
-    def get_data(self):
+    def prefetch_report_queryset(self, queryset):
+        # override to add select_related/prefetch_related needed to serialize report records
+        return queryset
+
+    def get_report_queryset(self):
         queryset = self.filter_queryset(self.get_queryset())
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         if lookup_url_kwarg in self.kwargs:
             filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
             queryset = queryset.filter(**filter_kwargs)
-        serializer = self.get_serializer(queryset, many=True)
+        return self.prefetch_report_queryset(queryset)
+
+    def flatten_record(self, record):
+        rowdata = {}
+        for fieldname, value in record.items():
+            if fieldname in self.csv_method_fields:
+                methodname = f"get_{fieldname}"
+                method = getattr(self, methodname)
+                fields = method(value)
+            elif isinstance(value, dict):  # nested serializers return plain dicts as of DRF 3.15
+                fields = get_flattened(fieldname, value)
+            else:
+                fields = [{fieldname: value}]
 
-        data = []
-        for record in serializer.data:
-            rowdata = {}
-            for fieldname, value in record.items():
-                if fieldname in self.csv_method_fields:
-                    methodname = f"get_{fieldname}"
-                    method = getattr(self, methodname)
-                    fields = method(value)
-                elif isinstance(value, OrderedDict):
-                    fields = get_flattened(fieldname, value)
-                else:
-                    fields = [{fieldname: value}]
+            for field in fields:
+                rowdata.update(field)
 
-                for field in fields:
-                    rowdata.update(field)
+        return rowdata
 
-            data.append(rowdata)
+    def get_data(self, queryset=None):
+        # streaming responses pass the queryset built in the view, so invalid filters are a 400 rather than
+        # an error raised mid-stream once the view has returned
+        if queryset is None:
+            queryset = self.get_report_queryset()
+        serializer = self.get_serializer(many=True).child
+        for instance in queryset.iterator(chunk_size=self.report_chunk_size):
+            yield self.flatten_record(serializer.to_representation(instance))
 
-        return data
+    def get_file_name(self, extension):
+        time_stamp = datetime.utcnow().strftime("%Y%m%d")
+        lang = translation.get_language()
+        return f"{self.file_prefix}-{time_stamp}-{lang}.{extension}".lower()
 
     def get_csv_response(self):
         fields = self.get_fields()
-        data = self.get_data()
-        time_stamp = datetime.utcnow().strftime("%Y%m%d")
+        data = self.get_data(self.get_report_queryset())
         lang = translation.get_language()
-        file_name = f"{self.file_prefix}-{time_stamp}-{lang}.csv".lower()
+        file_name = self.get_file_name("csv")
 
         report = CSVReport()
-        # assumes all fields present in all items
-        stream = report.stream(fields, data)
 
-        response = StreamingHttpResponse(stream, content_type="text/csv")
+        # the response is consumed after the view returns, so pin the request language for the queryset
+        def stream():
+            with translation.override(lang):
+                # assumes all fields present in all items
+                yield from report.stream(fields, data)
+
+        response = StreamingHttpResponse(stream(), content_type="text/csv")
         response["Content-Disposition"] = f'attachment; filename="{file_name}"'
         return response
 
@@ -123,6 +235,125 @@ class CSVReportMixin(BaseAPIViewSet):
 class ReportView(CSVReportMixin, BaseAPIViewSet):
     http_method_names = [method.lower() for method in SAFE_METHODS]
     serializer_class_geojson = None
+    # {flattened field name pattern: arrow type name}, for fields whose type can't be read off the serializer
+    arrow_field_types = {}
+
+    def get_flat_serializer_fields(self):
+        flat_fields = {}
+        for fieldname, field in self.get_serializer(many=True).child.get_fields().items():
+            if isinstance(field, serializers.Serializer):
+                for subfieldname, subfield in field.get_fields().items():
+                    flat_fields[f"{fieldname}__{subfieldname}"] = subfield
+            else:
+                flat_fields[fieldname] = field
+        return flat_fields
+
+    def get_arrow_schema(self, fields):
+        serializer_fields = self.get_flat_serializer_fields()
+        schema_fields = []
+        for fieldname in fields:
+            type_name = next(
+                (
+                    t
+                    for pattern, t in self.arrow_field_types.items()
+                    if fnmatchcase(fieldname, pattern)
+                ),
+                None,
+            )
+            if type_name is None:
+                type_name = get_serializer_field_type(serializer_fields.get(fieldname))
+            schema_fields.append(pa.field(fieldname, arrow_type(type_name)))
+        return pa.schema(schema_fields)
+
+    def get_arrow_response(self, report_class):
+        fields = self.get_fields()
+        report = report_class(self.get_arrow_schema(fields))
+        data = self.get_data(self.get_report_queryset())
+        lang = translation.get_language()
+        file_name = self.get_file_name(report.extension)
+
+        def stream():
+            with translation.override(lang):
+                yield from report.stream(data)
+
+        response = StreamingHttpResponse(stream(), content_type=report.media_type)
+        response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+        return response
+
+    def get_geojson_report_queryset(self):
+        self.serializer_class = self.serializer_class_geojson
+        return self.get_report_queryset()
+
+    def get_geojson_features(self, queryset=None):
+        # Feature dicts read from a server-side cursor; geometry is left as database GeoJSON text for dumps_feature
+        if queryset is None:
+            queryset = self.get_geojson_report_queryset()
+        context = {**self.get_serializer_context(), "raw_geometry": True}
+        serializer = self.serializer_class(many=True, context=context).child
+        for instance in queryset.iterator(chunk_size=self.report_chunk_size):
+            yield serializer.to_representation(instance)
+
+    def get_geojson_stream(self, ndjson=False, queryset=None):
+        """
+        FeatureCollection written feature by feature, not bound by geojson pagination;
+        with ndjson, one Feature per line and no enclosing collection.
+        """
+        if not ndjson:
+            yield b'{"type": "FeatureCollection", "features": ['
+        separator = ""
+        for feature in self.get_geojson_features(queryset):
+            feature = dumps_feature(feature)
+            if ndjson:
+                yield f"{feature}\n".encode()
+            else:
+                yield f"{separator}{feature}".encode()
+                separator = ", "
+        if not ndjson:
+            yield b"]}"
+
+    def get_flatgeobuf_features(self):
+        # properties flattened as in the tabular reports, so each gets a typed column rather than a JSON string
+        for feature in self.get_geojson_features():
+            feature["properties"] = self.flatten_record(feature["properties"])
+            yield dumps_feature(feature)
+
+    def get_geojson_stream_response(self):
+        ndjson = truthy(self.request.query_params.get("ndjson"))
+        queryset = self.get_geojson_report_queryset()
+        lang = translation.get_language()
+        if ndjson:
+            content_type, extension = "application/x-ndjson", "ndjson"
+        else:
+            content_type, extension = "application/geo+json", "geojson"
+
+        def stream():
+            with translation.override(lang):
+                yield from self.get_geojson_stream(ndjson=ndjson, queryset=queryset)
+
+        response = StreamingHttpResponse(stream(), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{self.get_file_name(extension)}"'
+        return response
+
+    def get_xlsx_sheets(self):
+        # sheet name: columns; override along with get_xlsx_rows for multi-sheet reports
+        return {self.file_prefix[:31]: self.get_fields()}
+
+    def get_xlsx_rows(self):
+        sheetname = self.file_prefix[:31]
+        for record in self.get_data():
+            yield sheetname, record
+
+    def get_xlsx_response(self):
+        report = XLSXReport(self.get_xlsx_sheets())
+        xlsxfile = TemporaryFile()
+        report.generate(xlsxfile, self.get_xlsx_rows())
+        content_length = xlsxfile.tell()
+        xlsxfile.seek(0)
+
+        response = FileResponse(xlsxfile, content_type=report.media_type)
+        response["Content-Length"] = content_length
+        response["Content-Disposition"] = f'attachment; filename="{self.get_file_name(report.extension)}"'
+        return response
 
     @action(detail=False, methods=["get"])
     def json(self, request, *args, **kwargs):  # default, for completeness
@@ -134,6 +365,16 @@ class ReportView(CSVReportMixin, BaseAPIViewSet):
         self.pagination_class = BaseGeoJsonPagination
         return self.list(request, *args, **kwargs)
 
+    @action(detail=False, methods=["get"])
+    def geojson_stream(self, request, *args, **kwargs):
+        return self.get_geojson_stream_response()
+
+    @action(detail=False, methods=["get"])
+    def flatgeobuf(self, request, *args, **kwargs):
+        return get_flatgeobuf_response(
+            self.get_flatgeobuf_features(), self.file_prefix, self.get_file_name("fgb")
+        )
+
     @action(detail=False, methods=["get"])
     def csv(self, request, *args, **kwargs):
         return self.get_csv_response()
@@ -141,3 +382,15 @@ class ReportView(CSVReportMixin, BaseAPIViewSet):
     @action(detail=True, methods=["get"])
     def csv_detail(self, request, *args, **kwargs):
         return self.get_csv_response()
+
+    @action(detail=False, methods=["get"])
+    def parquet(self, request, *args, **kwargs):
+        return self.get_arrow_response(ParquetReport)
+
+    @action(detail=False, methods=["get"])
+    def arrow(self, request, *args, **kwargs):
+        return self.get_arrow_response(ArrowReport)
+
+    @action(detail=False, methods=["get"])
+    def xlsx(self, request, *args, **kwargs):
+        return self.get_xlsx_response()
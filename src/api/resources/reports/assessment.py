@@ -1,15 +1,22 @@
-from functools import cache
+import hashlib
 from django.conf import settings
-from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
 from django_countries import countries
 from django_countries.serializers import CountryFieldMixin
-from django_filters import ChoiceFilter
+from django_filters import ChoiceFilter, ModelChoiceFilter
 from rest_framework import serializers
-from rest_framework_gis.fields import GeometryField, GeometrySerializerMethodField
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
-from . import BaseReportSerializer, ReportView
-from ..base import BaseAPIFilterSet
-from ...models import Assessment, ManagementArea
+from . import BaseReportSerializer, GeoJSONTextField, ReportView
+from ..base import BaseAPIFilterSet, SpatialFilter, management_area_choice_qs
+from ..management import get_simplify
+from ..tiles import get_assessment_clusters
+from ...models import Assessment, ManagementArea, SurveyAnswerLikert
 from ...permissions import AssessmentReadOnlyOrAuthenticatedUserPermission
 from ...utils import slugify
 from ...utils.assessment import (
@@ -18,9 +25,23 @@ from ...utils.assessment import (
     questionlikerts,
     get_attribute_answer,
     get_assessment_related_queryset,
+    cache_generation,
+    visibility_scope,
 )
 
 
+XLSX_ASSESSMENT_SHEET = "assessments"
+XLSX_ANSWER_SHEET = "answers"
+XLSX_ANSWER_FIELDS = [
+    "assessment_id",
+    "attribute",
+    "attribute_score",
+    "question",
+    "choice",
+    "explanation",
+]
+
+
 # TODO: deal with ManagementAreaZone, parent/containedby
 class ManagementAreaReportSerializer(CountryFieldMixin, BaseReportSerializer):
     protected_area = serializers.StringRelatedField()
@@ -76,12 +97,12 @@ class AssessmentReportSerializer(BaseReportSerializer):
     attributes = serializers.SerializerMethodField()
     score = serializers.SerializerMethodField()
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-    @cache
+    # noinspection PyMethodMayBeStatic
     def _attribute_scores(self, obj):
-        return attribute_scores(obj)
+        # memoized on the instance so attributes and score share one computation per record
+        if not hasattr(obj, "_attribute_scores"):
+            obj._attribute_scores = attribute_scores(obj)
+        return obj._attribute_scores
 
     def get_attributes(self, obj):
         return self._attribute_scores(obj)
@@ -133,26 +154,8 @@ class AssessmentReportSerializer(BaseReportSerializer):
 class AssessmentReportGeoSerializer(
     GeoFeatureModelSerializer, AssessmentReportSerializer
 ):
-    geom = GeometrySerializerMethodField()
-
-    def get_geom(self, obj):
-        if obj.management_area is not None:
-            polygon = obj.management_area.polygon
-            point = obj.management_area.point
-            geomfield = GeometryField(precision=settings.GEO_PRECISION, default=None)
-
-            geom = None
-            if polygon:
-                geom = polygon
-            elif point:
-                geom = point
-
-            if geom:
-                geomfield_value = GEOSGeometry(geom.wkt)
-                processed_geom_geojson = geomfield.to_representation(geomfield_value)
-                return GEOSGeometry(str(processed_geom_geojson))
-
-        return None
+    # annotated by AssessmentReportView.get_queryset
+    geom = GeoJSONTextField(source="geojson")
 
     class Meta(AssessmentReportSerializer.Meta):
         geo_field = "geom"
@@ -166,6 +169,7 @@ class AssessmentReportFilterSet(BaseAPIFilterSet):
         choices=countries,
         lookup_expr="icontains",
     )
+    management_area = ModelChoiceFilter(queryset=management_area_choice_qs)
 
     class Meta:
         model = Assessment
@@ -173,21 +177,75 @@ class AssessmentReportFilterSet(BaseAPIFilterSet):
 
 
 class AssessmentReportView(ReportView):
+    geometry_actions = ["geojson", "geojson_stream", "flatgeobuf"]
     ordering = ["name", "year"]
     serializer_class = AssessmentReportSerializer
     serializer_class_geojson = AssessmentReportGeoSerializer
     csv_method_fields = ["attributes"]
+    arrow_field_types = {
+        "*__score": "float64",
+        "*__choice": "int8",
+        "*__explanation": "string",
+        "score": "int64",
+        "management_area__countries": "list<string>",
+    }
     file_prefix = "assessmentreport"
     _question_likerts = None
     filterset_class = AssessmentReportFilterSet
+    filter_backends = ReportView.filter_backends + (SpatialFilter,)
+    bbox_fields = ["management_area__polygon", "management_area__point"]
+    near_field = "management_area__centroid"
     search_fields = ["name", "management_area__name"]
     permission_classes = [AssessmentReadOnlyOrAuthenticatedUserPermission]
 
     def get_queryset(self):
-        return (
-            get_assessment_related_queryset(self.request.user, Assessment)
-            .select_related("management_area", "management_area__protected_area")
-            .prefetch_related("assessment_flags")
+        queryset = get_assessment_related_queryset(self.request.user, Assessment)
+        if queryset.query.distinct:
+            # filter on the visible ids rather than use the DISTINCT queryset, which adds ORDER BY expressions
+            # (e.g. the ?near distance) to the select list and sorts every row before the LIMIT
+            queryset = Assessment.objects.filter(pk__in=queryset.order_by().values("pk"))
+        queryset = queryset.select_related(
+            "management_area", "management_area__protected_area"
+        ).prefetch_related("assessment_flags")
+        # geometry columns are only ever output as GeoJSON rendered by the database (below)
+        queryset = queryset.defer(*ManagementArea.geometry_fields("management_area"))
+        if self.serializer_class is self.serializer_class_geojson:
+            # render geometry to GeoJSON in the database instead of loading it into GEOS and re-encoding it
+            polygon_field = ManagementArea.polygon_field(get_simplify(self.request))
+            geometry = Coalesce(
+                f"management_area__{polygon_field}",
+                "management_area__point",
+                output_field=GeometryField(srid=4326),
+            )
+            queryset = queryset.annotate(
+                geojson=AsGeoJSON(geometry, precision=settings.GEO_PRECISION)
+            )
+        return queryset
+
+    def prefetch_report_queryset(self, queryset):
+        answers = SurveyAnswerLikert.objects.select_related(
+            "question", "question__attribute"
+        ).order_by(
+            "question__attribute__order",
+            "question__attribute__name",
+            "question__number",
+        )
+        return queryset.select_related(
+            "created_by",
+            "updated_by",
+            "organization",
+            "published_version",
+            "person_responsible",
+            "management_area__created_by",
+            "management_area__updated_by",
+            "management_area__management_authority",
+            "management_area__governance_type",
+        ).prefetch_related(
+            "attributes",
+            "management_area__stakeholder_groups",
+            "management_area__support_sources",
+            "management_area__regions",
+            Prefetch("survey_answer_likerts", queryset=answers),
         )
 
     def get_attributes(self, obj=None):
@@ -218,6 +276,65 @@ class AssessmentReportView(ReportView):
 
         return csv_fields
 
+    def get_xlsx_sheets(self):
+        # wide per-question columns are replaced by one row per answer in a long-format sheet
+        assessment_fields = [
+            f for f in self.get_flat_serializer_fields() if f not in self.csv_method_fields
+        ]
+        return {
+            XLSX_ASSESSMENT_SHEET: assessment_fields,
+            XLSX_ANSWER_SHEET: XLSX_ANSWER_FIELDS,
+        }
+
+    def get_xlsx_rows(self):
+        queryset = self.get_report_queryset()
+        serializer = self.get_serializer(many=True).child
+        for instance in queryset.iterator(chunk_size=self.report_chunk_size):
+            record = serializer.to_representation(instance)
+            attributes = record.pop("attributes") or []
+            yield XLSX_ASSESSMENT_SHEET, self.flatten_record(record)
+            for attribute in attributes:
+                for answer in attribute["answers"]:
+                    yield XLSX_ANSWER_SHEET, {
+                        "assessment_id": record["id"],
+                        "attribute": attribute["attribute"],
+                        "attribute_score": attribute["score"],
+                        "question": answer["question"],
+                        "choice": answer["choice"],
+                        "explanation": answer["explanation"],
+                    }
+
+    def get_zoom(self):
+        try:
+            zoom = int(self.request.query_params.get("zoom", ""))
+        except ValueError:
+            zoom = -1
+        if not 0 <= zoom <= settings.TILE_MAX_ZOOM:
+            raise serializers.ValidationError(
+                {"zoom": [f"Enter a whole number from 0 to {settings.TILE_MAX_ZOOM}"]}
+            )
+        return zoom
+
+    @action(detail=False, methods=["get"])
+    def clusters(self, request):
+        """
+        Assessments clustered on a grid for a map zoom level, as a FeatureCollection of cluster points with
+        count and mean score. Report filters apply. Cached per visibility, filters, zoom and data generation.
+        """
+        zoom = self.get_zoom()
+        query = sorted(
+            (k, v) for k, v in request.query_params.lists() if k not in ("zoom", "format")
+        )
+        query_hash = hashlib.sha256(repr(query).encode()).hexdigest()
+        scope = visibility_scope(request.user)
+        key = f"clusters:{self.file_prefix}:{scope}:{cache_generation()}:{zoom}:{query_hash}"
+        clusters = cache.get(key)
+        if clusters is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            clusters = get_assessment_clusters(queryset, zoom)
+            cache.set(key, clusters, settings.TILE_CACHE_TIMEOUT)
+        return Response(clusters)
+
     @property
     def question_likerts(self):
         if not self._question_likerts:
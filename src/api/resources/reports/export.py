@@ -0,0 +1,217 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone, translation
+from rest_framework import serializers, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from tempfile import TemporaryDirectory
+from urllib.parse import parse_qsl, urlencode
+from .assessment import AssessmentReportView
+from ..base import BaseAPIFilterSet, BaseAPISerializer, BaseAPIViewSet
+from ...models import ReportExport
+from ...permissions import ReadOnlyOrAuthenticatedCreate
+from ...reports import CSVReport, FlatGeobufReport
+from ...utils.assessment import data_generation
+
+
+REPORT_VIEWS = {
+    ReportExport.ASSESSMENTS: AssessmentReportView,
+}
+
+
+def get_report_view(export):
+    # Recreate the GET request the export stands in for, so the report view applies the same
+    # visibility (user), filters (query) and serialization it would synchronously
+    http_request = HttpRequest()
+    http_request.method = "GET"
+    http_request.GET = QueryDict(export.query)
+    request = Request(http_request)
+    request.user = export.created_by or AnonymousUser()
+    view_class = REPORT_VIEWS[export.report]
+    return view_class(
+        request=request, args=(), kwargs={}, format_kwarg=None, action=export.filetype
+    )
+
+
+def build_report_export(export):
+    view = get_report_view(export)
+    with translation.override(export.language), TemporaryDirectory() as tmpdir:
+        export.data_generation = data_generation()
+        file_name = view.get_file_name(export.filetype)
+        path = os.path.join(tmpdir, file_name)
+        if export.filetype == ReportExport.FLATGEOBUF:
+            # stored on S3, the file can be range-read by bbox through its spatial index
+            FlatGeobufReport(view.file_prefix).generate(path, view.get_flatgeobuf_features())
+        else:
+            if export.filetype == ReportExport.CSV:
+                chunks = CSVReport().stream(view.get_fields(), view.get_data())
+            else:
+                chunks = view.get_geojson_stream()
+            with open(path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        with open(path, "rb") as f:
+            export.file.save(file_name, File(f), save=False)
+
+
+def claim_report_export():
+    # jobs still marked running after the timeout are assumed to belong to a dead worker
+    stale = timezone.now() - timedelta(seconds=settings.REPORT_EXPORT_TIMEOUT)
+    with transaction.atomic():
+        export = (
+            ReportExport.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ReportExport.PENDING)
+                | Q(status=ReportExport.RUNNING, started_on__lt=stale)
+            )
+            .order_by("created_on")
+            .first()
+        )
+        if export is None:
+            return None
+        export.status = ReportExport.RUNNING
+        export.started_on = timezone.now()
+        export.save()
+    return export
+
+
+def run_report_export(export):
+    try:
+        build_report_export(export)
+        export.status = ReportExport.COMPLETE
+        export.error = ""
+    except Exception as e:
+        export.status = ReportExport.FAILED
+        export.error = str(e)
+    export.completed_on = timezone.now()
+    export.save()
+    return export
+
+
+def prune_report_exports():
+    # finished exports are no longer reused after REPORT_EXPORT_MAX_AGE; their stored files go with them (signals)
+    expired = timezone.now() - timedelta(seconds=settings.REPORT_EXPORT_MAX_AGE)
+    deleted, _ = ReportExport.objects.filter(
+        status__in=[ReportExport.COMPLETE, ReportExport.FAILED], completed_on__lt=expired
+    ).delete()
+    return deleted
+
+
+def get_reusable_export(query_hash):
+    exports = ReportExport.objects.filter(query_hash=query_hash)
+    in_progress = exports.filter(
+        status__in=[ReportExport.PENDING, ReportExport.RUNNING]
+    ).first()
+    if in_progress:
+        return in_progress
+
+    max_age = timezone.now() - timedelta(seconds=settings.REPORT_EXPORT_MAX_AGE)
+    return (
+        exports.filter(
+            status=ReportExport.COMPLETE,
+            completed_on__gte=max_age,
+            data_generation=data_generation(),
+        )
+        .order_by("-completed_on")
+        .first()
+    )
+
+
+class ReportQueryField(serializers.Field):
+    """Report filters as an object of query params, stored as a sorted query string."""
+
+    ignored_params = ("cursor", "format", "limit", "page")
+
+    def to_internal_value(self, data):
+        if not isinstance(data, dict):
+            raise serializers.ValidationError("Expected an object of report filters.")
+        params = []
+        for key, value in data.items():
+            if key in self.ignored_params:
+                continue
+            values = value if isinstance(value, list) else [value]
+            params.extend((key, str(v)) for v in values)
+        return urlencode(sorted(params))
+
+    def to_representation(self, value):
+        query = {}
+        for key, val in parse_qsl(value, keep_blank_values=True):
+            if key in query:
+                existing = query[key]
+                query[key] = existing + [val] if isinstance(existing, list) else [existing, val]
+            else:
+                query[key] = val
+        return query
+
+
+class ReportExportSerializer(BaseAPISerializer):
+    query = ReportQueryField(required=False)
+    status = serializers.CharField(source="get_status_display", read_only=True)
+    url = serializers.SerializerMethodField()
+
+    # noinspection PyMethodMayBeStatic
+    def get_url(self, obj):
+        if obj.status == ReportExport.COMPLETE and obj.file:
+            return obj.file.url
+        return None
+
+    def validate(self, data):
+        data["language"] = translation.get_language()
+        return super().validate(data)
+
+    class Meta:
+        model = ReportExport
+        exclude = ["file"]
+        read_only_fields = ["language", "error", "started_on", "completed_on"]
+
+
+class ReportExportFilterSet(BaseAPIFilterSet):
+    class Meta:
+        model = ReportExport
+        exclude = ["file"]
+
+
+class ReportExportViewSet(BaseAPIViewSet):
+    """
+    POST queues a report export (report, filetype, query filters) to be built by the `runworker` command;
+    GET polls its status and, once complete, its download url. Requests matching an export that is still
+    in progress, or complete and built from current data, return that export instead of queueing a new one.
+    """
+
+    http_method_names = ["get", "post", "head", "options"]
+    serializer_class = ReportExportSerializer
+    filterset_class = ReportExportFilterSet
+    permission_classes = [ReadOnlyOrAuthenticatedCreate]
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = ReportExport.objects.select_related("created_by")
+        if user.is_authenticated and user.is_superuser:
+            return qs
+        if user.is_authenticated:
+            return qs.filter(created_by=user)
+        return qs.none()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        query_hash = ReportExport.make_query_hash(
+            data["report"],
+            data["filetype"],
+            data["language"],
+            data.get("query", ""),
+            request.user,
+        )
+        export = get_reusable_export(query_hash)
+        if export is not None:
+            return Response(self.get_serializer(export).data, status=status.HTTP_200_OK)
+
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
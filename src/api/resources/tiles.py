@@ -0,0 +1,203 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from ..models import Assessment, ManagementArea, SurveyAnswerLikert, SurveyQuestionLikert
+from ..models.survey import EXCELLENT
+from ..permissions import ReadOnly
+from ..utils.assessment import (
+    cache_generation,
+    get_assessment_related_queryset,
+    visibility_scope,
+)
+
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+ASSESSMENT_LAYER = "assessments"
+
+# Scores mirror utils.assessment.attribute_scores/assessment_score: per attribute, points over possible points
+# of non-null answers to questions in the assessment's attributes; per assessment, the mean attribute score
+# as a percentage. Common table expressions for the ids in the {assessments} CTE; params: SCORE_PARAMS.
+ASSESSMENT_SCORES_SQL = """
+attribute_scores AS (
+    SELECT ans.assessment_id,
+    ROUND(SUM(ans.choice)::numeric / (COUNT(ans.choice) * %s) * %s, 1) AS score
+    FROM {answer} ans
+    JOIN {question} q ON q.id = ans.question_id
+    JOIN {assessment_attributes} aa ON aa.assessment_id = ans.assessment_id AND aa.attribute_id = q.attribute_id
+    WHERE ans.choice IS NOT NULL AND ans.assessment_id IN (SELECT id FROM {assessments})
+    GROUP BY ans.assessment_id, q.attribute_id
+),
+scores AS (
+    SELECT assessment_id, ROUND(SUM(score) / (COUNT(*) * %s) * 100)::integer AS score
+    FROM attribute_scores
+    GROUP BY assessment_id
+)"""
+
+ASSESSMENT_TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%s, %s, %s) AS geom, ST_Transform(ST_TileEnvelope(%s, %s, %s), 4326) AS geom_4326
+),
+tile_assessments AS (
+    SELECT a.id, a.management_area_id, a.year, a.status, COALESCE(ma.{polygon_field}, ma.point) AS geom
+    FROM {assessment} a
+    JOIN {managementarea} ma ON ma.id = a.management_area_id, bounds
+    WHERE a.id IN ({visible})
+    AND (ma.polygon && bounds.geom_4326 OR (ma.polygon IS NULL AND ma.point && bounds.geom_4326))
+),
+{scores},
+mvtgeom AS (
+    SELECT ST_AsMVTGeom(ST_Transform(t.geom, 3857), bounds.geom, %s, %s, true) AS geom,
+    t.id, t.management_area_id AS management_area, s.score, t.year, t.status
+    FROM tile_assessments t
+    LEFT JOIN scores s ON s.assessment_id = t.id, bounds
+)
+SELECT ST_AsMVT(mvtgeom.*, %s, %s, 'geom', 'id')
+FROM mvtgeom
+WHERE geom IS NOT NULL
+"""
+
+# Assessments grouped by snapping their management area centroid (a point for areas without a polygon) to a grid
+# in degrees; each cluster is placed at the centroid of its members.
+ASSESSMENT_CLUSTER_SQL = """
+WITH cluster_assessments AS (
+    SELECT a.id, COALESCE(ma.centroid, ma.point) AS geom
+    FROM {assessment} a
+    JOIN {managementarea} ma ON ma.id = a.management_area_id
+    WHERE a.id IN ({visible})
+    AND COALESCE(ma.centroid, ma.point) IS NOT NULL
+),
+{scores},
+clusters AS (
+    SELECT ST_Centroid(ST_Collect(c.geom)) AS geom,
+    COUNT(*) AS count,
+    ROUND(AVG(s.score))::integer AS score,
+    CASE WHEN COUNT(*) = 1 THEN MIN(c.id) END AS assessment
+    FROM cluster_assessments c
+    LEFT JOIN scores s ON s.assessment_id = c.id
+    GROUP BY ST_SnapToGrid(c.geom, %s)
+)
+SELECT ST_X(geom), ST_Y(geom), count, score, assessment
+FROM clusters
+ORDER BY count DESC
+"""
+SCORE_PARAMS = [EXCELLENT, settings.ATTRIBUTE_NORMALIZER, settings.ATTRIBUTE_NORMALIZER]
+
+
+class MVTRenderer(BaseRenderer):
+    # lets clients ask for tiles by media type; tile bodies are returned as-is and error details are dropped
+    media_type = MVT_CONTENT_TYPE
+    format = "mvt"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data if isinstance(data, bytes) else b""
+
+
+def get_tile_polygon_field(z):
+    # overview zooms draw the stored simplified polygons; the tile grid can't show more detail anyway
+    for simplify in (ManagementArea.SIMPLIFY_LOW, ManagementArea.SIMPLIFY_MEDIUM):
+        if z <= settings.TILE_SIMPLIFY_MAX_ZOOM[simplify]:
+            return ManagementArea.polygon_field(simplify)
+    return ManagementArea.polygon_field(ManagementArea.SIMPLIFY_FULL)
+
+
+def get_scores_sql(assessments):
+    return ASSESSMENT_SCORES_SQL.format(
+        assessments=assessments,
+        answer=SurveyAnswerLikert._meta.db_table,
+        question=SurveyQuestionLikert._meta.db_table,
+        assessment_attributes=Assessment.attributes.through._meta.db_table,
+    )
+
+
+def get_assessment_tile(user, z, x, y):
+    visible_sql, visible_params = (
+        # no ordering: on the distinct queryset, Meta.ordering columns would be added to the select list
+        get_assessment_related_queryset(user, Assessment)
+        .order_by()
+        .values("pk")
+        .query.sql_with_params()
+    )
+    sql = ASSESSMENT_TILE_SQL.format(
+        assessment=Assessment._meta.db_table,
+        managementarea=ManagementArea._meta.db_table,
+        scores=get_scores_sql("tile_assessments"),
+        visible=visible_sql,
+        polygon_field=get_tile_polygon_field(z),
+    )
+    params = [
+        z, x, y, z, x, y,
+        *visible_params,
+        *SCORE_PARAMS,
+        settings.TILE_EXTENT, settings.TILE_BUFFER,
+        ASSESSMENT_LAYER, settings.TILE_EXTENT,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] else b""
+
+
+def get_cluster_grid_size(zoom):
+    # degrees spanned by CLUSTER_GRID_PIXELS at the zoom level's equatorial scale (256px tiles)
+    return 360 / 2**zoom * settings.CLUSTER_GRID_PIXELS / 256
+
+
+def get_assessment_clusters(queryset, zoom):
+    """
+    GeoJSON FeatureCollection of assessment clusters at a map zoom level, computed in PostGIS.
+    Properties: count, mean score, and the assessment id of single-assessment clusters.
+    :param queryset: the (visible, filtered) assessments to cluster
+    """
+    visible_sql, visible_params = queryset.order_by().values("pk").query.sql_with_params()
+    sql = ASSESSMENT_CLUSTER_SQL.format(
+        assessment=Assessment._meta.db_table,
+        managementarea=ManagementArea._meta.db_table,
+        scores=get_scores_sql("cluster_assessments"),
+        visible=visible_sql,
+    )
+    params = [*visible_params, *SCORE_PARAMS, get_cluster_grid_size(zoom)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(x, settings.GEO_PRECISION), round(y, settings.GEO_PRECISION)],
+            },
+            "properties": {"count": count, "score": score, "assessment": assessment},
+        }
+        for x, y, count, score, assessment in rows
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+@api_view(permissions.SAFE_METHODS)
+@permission_classes((ReadOnly,))
+@renderer_classes((MVTRenderer, JSONRenderer))
+def assessment_tile(request, z, x, y):
+    """
+    Mapbox Vector Tile of management area geometries for the assessments visible to the requesting user,
+    with assessment id, management area id, score, year and status as feature properties.
+    """
+    z, x, y = int(z), int(x), int(y)
+    if z > settings.TILE_MAX_ZOOM or x >= 2**z or y >= 2**z:
+        raise NotFound()
+
+    scope = visibility_scope(request.user)
+    key = f"tiles:{ASSESSMENT_LAYER}:{scope}:{cache_generation()}:{z}/{x}/{y}"
+    tile = cache.get(key)
+    if tile is None:
+        tile = get_assessment_tile(request.user, z, x, y)
+        cache.set(key, tile, settings.TILE_CACHE_TIMEOUT)
+
+    return HttpResponse(tile, content_type=MVT_CONTENT_TYPE)
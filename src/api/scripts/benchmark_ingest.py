@@ -0,0 +1,79 @@
+"""
+Times management area import file parsing on a synthetic WDPA-sized marine area (many overlapping,
+coastline-like polygons), or on a real zipped export:
+python manage.py runscript benchmark_ingest --script-args features=400 vertices=5000
+python manage.py runscript benchmark_ingest --script-args path=/tmp/WDPA_WDOECM_marine.zip
+"""
+import json
+import math
+import random
+import resource
+import time
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from ..utils.management import get_multipolygon_from_zip
+
+FIELD = "import_file"
+
+
+def coastline_ring(center_x, center_y, radius, vertices):
+    # jagged ring: many vertices, self-similar noise, like digitized coastline
+    coordinates = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * (1 + 0.15 * math.sin(angle * 37) + 0.05 * random.random())
+        coordinates.append(
+            [round(center_x + r * math.cos(angle), 6), round(center_y + r * math.sin(angle), 6)]
+        )
+    coordinates.append(coordinates[0])
+    return coordinates
+
+
+def write_synthetic_zip(path, features, vertices):
+    random.seed(0)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("marine_area.geojson", "w") as f:
+            f.write(b'{"type": "FeatureCollection", "features": [')
+            for i in range(features):
+                # overlapping parts scattered over a ~10 degree wide marine area
+                ring = coastline_ring(
+                    160 + random.random() * 10,
+                    -20 + random.random() * 10,
+                    0.2 + random.random() * 0.5,
+                    vertices,
+                )
+                feature = {
+                    "type": "Feature",
+                    "properties": {"WDPAID": i},
+                    "geometry": {"type": "Polygon", "coordinates": [ring]},
+                }
+                separator = ", " if i else ""
+                f.write(f"{separator}{json.dumps(feature)}".encode())
+            f.write(b"]}")
+
+
+def benchmark(path):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        multipolygon = get_multipolygon_from_zip(FIELD, f)
+    elapsed = time.perf_counter() - start
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"file: {path} ({Path(path).stat().st_size / 1048576:.1f} MB)")
+    print(f"parse + union: {elapsed:.2f} s, max RSS: {max_rss_mb:.0f} MB")
+    print(f"result: {len(multipolygon)} polygons, {multipolygon.num_coords} vertices")
+
+
+def run(*args):
+    options = dict(arg.split("=", 1) for arg in args)
+    if "path" in options:
+        benchmark(options["path"])
+        return
+
+    features = int(options.get("features", 400))
+    vertices = int(options.get("vertices", 5000))
+    with TemporaryDirectory() as tempdir:
+        path = Path(tempdir) / "synthetic_marine_area.zip"
+        write_synthetic_zip(path, features, vertices)
+        print(f"synthetic: {features} features x {vertices} vertices")
+        benchmark(path)
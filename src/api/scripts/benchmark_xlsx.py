@@ -0,0 +1,75 @@
+"""
+Times AssessmentXLSX workbook generation (and saving) for an assessment: with the previous approach of
+rescanning the choices sheet and creating a DataValidation for every question, as now, and from a stored template.
+Use an assessment with all attributes selected to cover the full question bank:
+python manage.py runscript benchmark_xlsx --script-args assessment=12 repeat=5
+"""
+import statistics
+import time
+from io import BytesIO
+from openpyxl.worksheet.datavalidation import DataValidation
+from ..ingest.xlsx import AssessmentXLSX
+from ..models import Assessment
+
+
+class RescanAssessmentXLSX(AssessmentXLSX):
+    def add_survey_validation(self, qkey):
+        val_formula = ""
+        for i, row in enumerate(self.ws_choices.iter_rows()):
+            key = row[0].value
+            if key == qkey:
+                val_formula = f"{self.sheetnames[1]}!$B${i + 1}:$E${i + 1}"
+        validation = DataValidation(
+            type="list",
+            allow_blank=True,
+            formula1=val_formula,
+            showErrorMessage=True,
+            errorTitle="invalid choice",
+            error="Please select a choice from the list",
+        )
+        self.ws_survey.add_data_validation(validation)
+        return validation
+
+
+def benchmark(label, xlsx_class, assessment, repeat, method="generate_from_assessment"):
+    generate_timings = []
+    save_timings = []
+    for _ in range(repeat):
+        xlsx = xlsx_class(assessment)
+        # questions and answers are queried before timing, so only workbook building is measured
+        len(xlsx.questions)
+        len(xlsx.answers)
+
+        start = time.perf_counter()
+        getattr(xlsx, method)()
+        generate_timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with BytesIO() as f:
+            xlsx.workbook.save(f)
+            size = f.tell()
+        save_timings.append(time.perf_counter() - start)
+
+    validations = len(xlsx.ws_survey.data_validations.dataValidation)
+    print(
+        f"{label}: generate {statistics.median(generate_timings) * 1000:.0f} ms, "
+        f"save {statistics.median(save_timings) * 1000:.0f} ms (median of {repeat}), "
+        f"{validations} validations, {size / 1024:.0f} KB"
+    )
+
+
+def run(*args):
+    options = dict(arg.split("=", 1) for arg in args)
+    repeat = int(options.get("repeat", 5))
+    if "assessment" in options:
+        assessment = Assessment.objects.get(pk=options["assessment"])
+    else:
+        assessment = Assessment.objects.order_by("pk").first()
+
+    xlsx = AssessmentXLSX(assessment)
+    attributes = assessment.attributes.count()
+    print(f"assessment {assessment.pk}: {attributes} attributes, {len(xlsx.questions)} questions in bank")
+    benchmark("rescan", RescanAssessmentXLSX, assessment, repeat)
+    benchmark("indexed", AssessmentXLSX, assessment, repeat)
+    # the first call also builds and stores the template
+    benchmark("template", AssessmentXLSX, assessment, repeat, "generate_from_template")
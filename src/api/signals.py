@@ -3,6 +3,7 @@ from django.conf import settings
 from django.core.files.storage import default_storage
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from .utils.assessment import DATA_GENERATION, QUESTION_BANK_GENERATION, bump_generation
 from .utils.email import (
     email_elinor_admins_flag,
     email_assessment_admins_flag,
@@ -11,10 +12,14 @@ from .utils.email import (
 from .models import (
     Assessment,
     AssessmentFlag,
+    Attribute,
     Collaborator,
     Document,
     ManagementArea,
     Profile,
+    ReportExport,
+    SurveyAnswerLikert,
+    SurveyQuestionLikert,
 )
 
 
@@ -35,7 +40,8 @@ def move_model_file(instance, filefield):
         default_storage.save(newpath, file)
         default_storage.delete(oldpath)
         file.name = newpath
-        instance.save()
+        # only the path changed: skip full_clean and derived field updates of a full save
+        type(instance).objects.filter(pk=instance.pk).update(**{filefield: newpath})
 
 
 def delete_model_file(instance, filefield):
@@ -47,6 +53,22 @@ def delete_model_file(instance, filefield):
         default_storage.delete(path)
 
 
+@receiver([post_save, post_delete], sender=Assessment)
+@receiver([post_save, post_delete], sender=Collaborator)
+@receiver([post_save, post_delete], sender=ManagementArea)
+@receiver([post_save, post_delete], sender=SurveyAnswerLikert)
+def bump_data_generation(sender, **kwargs):
+    # the models data_generation covers; cached tiles and clusters are keyed on cache_generation
+    bump_generation(DATA_GENERATION)
+
+
+@receiver([post_save, post_delete], sender=Attribute)
+@receiver([post_save, post_delete], sender=SurveyQuestionLikert)
+def bump_question_bank_version(sender, **kwargs):
+    # stored workbook templates and the question banks compiled by xlsx workers are keyed on it
+    bump_generation(QUESTION_BANK_GENERATION)
+
+
 @receiver(post_save, sender=Assessment)
 def move_ap_files(sender, instance, created, **kwargs):
     move_model_file(instance, "management_plan_file")
@@ -79,6 +101,11 @@ def delete_ma_files(sender, instance, **kwargs):
     delete_model_file(instance, "map_image")
 
 
+@receiver(post_delete, sender=ReportExport)
+def delete_report_export_files(sender, instance, **kwargs):
+    delete_model_file(instance, "file")
+
+
 @receiver(post_save, sender=AssessmentFlag)
 def notify_assessment_flagged(sender, instance, created, **kwargs):
     if created:
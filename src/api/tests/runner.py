@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Runs the suite with GEOMETRY_FETCH_GUARD on, so API tests fail on views that fetch geometry they don't use."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.GEOMETRY_FETCH_GUARD = True
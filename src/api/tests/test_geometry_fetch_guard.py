@@ -0,0 +1,140 @@
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from api.models import Assessment, Collaborator, ManagementArea, ManagementAreaZone
+from api.utils.spatial import GeometryFetchError, forbid_geometry_fetch
+
+
+def create_management_area(name, bbox):
+    return ManagementArea.objects.create(
+        name=name,
+        recognition_level=[],
+        polygon=MultiPolygon(Polygon.from_bbox(bbox), srid=4326),
+    )
+
+
+class GeometryFetchGuardTests(TestCase):
+    """
+    Non-spatial requests that reference management areas run without selecting their geometry.
+    GEOMETRY_FETCH_GUARD is on for the whole suite (api.tests.runner.TestRunner).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            "guard", "guard@example.com", "password"
+        )
+        cls.management_area = create_management_area("guarded", (0, 0, 1, 1))
+        cls.other_management_area = create_management_area("other", (2, 2, 3, 3))
+        cls.assessment = Assessment.objects.create(
+            name="guarded",
+            year=2024,
+            person_responsible=cls.user,
+            management_area=cls.management_area,
+        )
+        cls.zone = ManagementAreaZone.objects.create(
+            name="guarded", management_area=cls.management_area
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_guard(self):
+        with forbid_geometry_fetch():
+            self.assertEqual(ManagementArea.objects.defer_geometry().count(), 2)
+            list(ManagementArea.objects.defer_geometry().order_by("pk"))
+            with self.assertRaises(GeometryFetchError):
+                list(ManagementArea.objects.all())
+            with self.assertRaises(GeometryFetchError):
+                list(Assessment.objects.select_related("management_area"))
+
+    def test_assessment_filter(self):
+        response = self.client.get(
+            "/v2/assessments/", {"management_area": self.management_area.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_assessment_report_filter(self):
+        response = self.client.get(
+            "/v2/reports/assessments/", {"management_area": self.management_area.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_assessment_create(self):
+        response = self.client.post(
+            "/v2/assessments/",
+            {
+                "name": "created",
+                "year": 2024,
+                "person_responsible": self.user.pk,
+                "management_area": self.other_management_area.pk,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_assessment_update(self):
+        response = self.client.patch(
+            f"/v2/assessments/{self.assessment.pk}/",
+            {"management_area": self.other_management_area.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_zone_filter(self):
+        response = self.client.get(
+            "/v2/managementareazones/", {"management_area": self.management_area.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_zone_update(self):
+        response = self.client.patch(
+            f"/v2/managementareazones/{self.zone.pk}/",
+            {"management_area": self.other_management_area.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+
+class NearestReportTests(TestCase):
+    """?near on the report views of a non-superuser, whose visible assessments are a DISTINCT queryset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("near", "near@example.com", "password")
+        cls.assessments = []
+        for name, bbox in (("far", (10, 10, 11, 11)), ("near", (0, 0, 1, 1))):
+            assessment = Assessment.objects.create(
+                name=name,
+                year=2024,
+                person_responsible=cls.user,
+                management_area=create_management_area(name, bbox),
+            )
+            Collaborator.objects.get_or_create(
+                assessment=assessment, user=cls.user, defaults={"role": Collaborator.ADMIN}
+            )
+            cls.assessments.append(assessment)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_report_near(self):
+        far, near = self.assessments
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/v2/reports/assessments/", {"near": "0.5,0.5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a["id"] for a in response.data["results"]], [near.pk, far.pk])
+        self.assertFalse([q["sql"] for q in queries.captured_queries if "DISTINCT" in q["sql"]])
+
+    def test_report_csv_near(self):
+        response = self.client.get("/v2/reports/assessments/csv/", {"near": "0.5,0.5", "k": 1})
+        self.assertEqual(response.status_code, 200)
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 2)
@@ -28,7 +28,9 @@ from .resources.assessment import (
     CollaboratorViewSet,
 )
 from .resources.reports.assessment import AssessmentReportView
+from .resources.reports.export import ReportExportViewSet
 from .resources.survey import SurveyAnswerLikertViewSet, SurveyQuestionLikertViewSet
+from .resources.tiles import assessment_tile
 
 
 router = ElinorDefaultRouter()
@@ -60,6 +62,7 @@ router.register(r"users", UserViewSet, "user")
 
 # Reporting resources (read-only)
 router.register(f"reports/assessments", AssessmentReportView, "assessmentreport")
+router.register(r"reports/exports", ReportExportViewSet, "reportexport")
 
 api_urls = router.urls + [
     re_path(r"^health/$", health),
@@ -71,4 +74,9 @@ api_urls = router.urls + [
     ),
     path("contactelinoradmins", contact_elinor_admins, name="contactelinoradmin"),
     path("countries", countries_view, name="countries"),
+    re_path(
+        r"^tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$",
+        assessment_tile,
+        name="tiles",
+    ),
 ]
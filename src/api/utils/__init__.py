@@ -1,9 +1,10 @@
 import re
 import subprocess
+from django.conf import settings
 from django.db.models.fields.related import ManyToManyField
 from django.utils.html import strip_tags
 from typing import Optional
-from zipfile import ZipFile
+from zipfile import BadZipFile, ZipFile
 
 
 def run_subprocess(command, std_input=None, to_file=None):
@@ -43,6 +44,12 @@ def truthy(val):
     return val in ("t", "T", "true", "True", "TRUE", True, 1)
 
 
+def chunked(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
 def strip_html(val):
     val = val or ""
     val = strip_tags(val)
@@ -50,12 +57,23 @@ def strip_html(val):
     return val.strip()
 
 
-def unzip_file(file, temppath):
+def open_zip(file):
+    """
+    ZipFile over the uploaded file, after checking member count, total size and compression ratios as declared
+    in the central directory. Members are then read straight from the archive (reads stop at the declared size),
+    so nothing is extracted to disk.
+    :raises BadZipFile: if the file isn't a zip, or exceeds the ZIP_MAX_* settings
+    """
     zf = ZipFile(file)
-    zf.extractall(temppath)
-    dirs = [f for f in temppath.iterdir() if temppath.joinpath(f).is_dir()]
-    files = [f for f in temppath.iterdir() if temppath.joinpath(f).is_file()]
-    return dirs, files
+    members = [info for info in zf.infolist() if not info.is_dir()]
+    if len(members) > settings.ZIP_MAX_MEMBERS:
+        raise BadZipFile(f"zip file contains more than {settings.ZIP_MAX_MEMBERS} files")
+    if sum(info.file_size for info in members) > settings.ZIP_MAX_SIZE:
+        raise BadZipFile(f"zip file contents larger than {settings.ZIP_MAX_SIZE} bytes")
+    for info in members:
+        if info.file_size > info.compress_size * settings.ZIP_MAX_RATIO:
+            raise BadZipFile(f"{info.filename} is compressed more than {settings.ZIP_MAX_RATIO}:1")
+    return zf
 
 
 def get_m2m_fields(model):
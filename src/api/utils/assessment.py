@@ -1,6 +1,9 @@
+import uuid
 from collections import defaultdict
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max, Q
 
 from .email import notify_assessment_admins
 from ..ingest import ERROR
@@ -8,6 +11,8 @@ from ..models import (
     Assessment,
     AssessmentChange,
     Attribute,
+    Collaborator,
+    ManagementArea,
     SurveyAnswerLikert,
     SurveyQuestionLikert,
 )
@@ -20,17 +25,31 @@ def questionlikerts():
     )
 
 
+def _is_prefetched(instance, *relations):
+    prefetched = getattr(instance, "_prefetched_objects_cache", {})
+    return all(relation in prefetched for relation in relations)
+
+
 def attribute_scores(assessment):
     assessment_attributes = assessment.attributes.all()
-    answers = (
-        SurveyAnswerLikert.objects.filter(assessment=assessment, question__attribute__in=assessment_attributes)
-        .select_related("question", "question__attribute")
-        .order_by(
-            "question__attribute__order",
-            "question__attribute__name",
-            "question__number",
+    if _is_prefetched(assessment, "attributes", "survey_answer_likerts"):
+        # use answers prefetched (in attribute/question order) by the caller instead of querying per assessment
+        attribute_ids = {a.pk for a in assessment_attributes}
+        answers = [
+            a
+            for a in assessment.survey_answer_likerts.all()
+            if a.question.attribute_id in attribute_ids
+        ]
+    else:
+        answers = (
+            SurveyAnswerLikert.objects.filter(assessment=assessment, question__attribute__in=assessment_attributes)
+            .select_related("question", "question__attribute")
+            .order_by(
+                "question__attribute__order",
+                "question__attribute__name",
+                "question__number",
+            )
         )
-    )
 
     attributes = defaultdict(list)
     for a in answers:
@@ -169,6 +188,59 @@ def get_assessment_related_queryset(user, model):
     return qs.filter(qry).distinct()
 
 
+def visibility_scope(user):
+    # users who see the same set of assessments under get_assessment_related_queryset share cached output
+    if user is not None and user.is_authenticated:
+        return "all" if user.is_superuser else f"user:{user.pk}"
+    return "public"
+
+
 def assessment_xlsx_has_errors(assessment_xlsx):
     errors = [v for k, v in assessment_xlsx.validations.items() if v["level"] == ERROR]
     return len(errors) > 0
+
+
+def _generation(models):
+    tokens = []
+    for model in models:
+        latest = model.objects.aggregate(updated_on=Max("updated_on"), count=Count("pk"))
+        updated_on = latest["updated_on"]
+        tokens.append(f"{updated_on.timestamp() if updated_on else 0}:{latest['count']}")
+    return "-".join(tokens)
+
+
+def data_generation():
+    """
+    Token that changes whenever data feeding assessment reports is added, edited or deleted: the latest
+    updated_on and row count of each contributing model. Used to decide whether a stored report is stale.
+    """
+    return _generation((Assessment, Collaborator, ManagementArea, SurveyAnswerLikert))
+
+
+DATA_GENERATION = "data"
+QUESTION_BANK_GENERATION = "question_bank"
+
+
+def get_generation(name):
+    return caches["generations"].get_or_set(name, lambda: uuid.uuid4().hex)
+
+
+def bump_generation(name):
+    # once the change is committed, so nothing is cached under the new token from the data it replaces
+    transaction.on_commit(lambda: caches["generations"].set(name, uuid.uuid4().hex))
+
+
+def cache_generation():
+    """
+    Cheap counterpart of data_generation for keying cached tiles and clusters: a token read from the shared
+    generations cache, replaced by signals on the same models and by bulk writes that bypass them.
+    """
+    return get_generation(DATA_GENERATION)
+
+
+def question_bank_version():
+    """
+    Token that changes whenever attributes or Likert questions are added, edited or deleted; read from the
+    shared generations cache and replaced by signals on both models.
+    """
+    return get_generation(QUESTION_BANK_GENERATION)
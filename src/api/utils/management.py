@@ -1,20 +1,23 @@
+import hashlib
 import zipfile
+from contextlib import contextmanager
 from django.conf import settings
-from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.gdal import CoordTransform, DataSource, SpatialReference
 from django.contrib.gis.gdal.error import GDALException
-from django.contrib.gis.gdal.geometries import MultiPolygon, OGRGeomType
-from django.contrib.gis.geos import LinearRing, Polygon as GEOSPolygon
+from django.contrib.gis.geos import GeometryCollection, GEOSException, MultiPolygon
 from django.core.exceptions import ValidationError
 from django.template.defaultfilters import filesizeformat
 from django.utils.translation import gettext_lazy as _
-from pathlib import Path
-from tempfile import TemporaryDirectory
+from pathlib import PurePosixPath
+from tempfile import NamedTemporaryFile
+from . import open_zip
 
 
 MAXIMUM_FILESIZE = 10485760  # 10MB
-ACCEPTED_EXTENSIONS = (".shp",)
-ACCEPTED_GEOGCS = ("GEOGCS",)
-ACCEPTED_EPSG = ("4326",)
+ACCEPTED_EXTENSIONS = (".shp", ".gpkg", ".geojson", ".json", ".kml")
+TARGET_SRID = 4326
+# polygons (or partial unions) unioned at a time; bounds the size of any single GEOS union
+UNION_BATCH_SIZE = 256
 POLYGON = "Polygon"
 POLYGON25D = "Polygon25D"
 MULTIPOLYGON = "MultiPolygon"
@@ -22,187 +25,262 @@ MULTIPOLYGON25D = "MultiPolygon25D"
 ACCEPTED_GEOMETRIES = (POLYGON, POLYGON25D, MULTIPOLYGON, MULTIPOLYGON25D)
 
 
-def get_extension_from_files(files):
-    for file in files:
-        ext = file.suffix
-        if ext in ACCEPTED_EXTENSIONS:
-            return ext
+def get_content_hash(file):
+    sha = hashlib.sha256()
+    for chunk in file.chunks():
+        sha.update(chunk)
+    file.seek(0)
+    return sha.hexdigest()
+
+
+def get_data_file(paths):
+    # shallowest file with an accepted extension, skipping macOS resource forks
+    for path in sorted(paths, key=lambda p: (len(p.parts), str(p))):
+        if (
+            path.suffix.lower() in ACCEPTED_EXTENSIONS
+            and "__MACOSX" not in path.parts
+            and not path.name.startswith(".")
+        ):
+            return path
 
     return None
 
 
-def get_zip_content(import_file_field, temppath):
-    field = import_file_field.field.name
-    import_file = import_file_field.file
+def get_zip_data_member(zf):
+    """:return: name of the data file among the zip's members, or None"""
+    paths = [PurePosixPath(name) for name in zf.namelist() if not name.endswith("/")]
+    path = get_data_file(paths)
+    return str(path) if path is not None else None
+
 
+def open_import_zip(field, import_file):
     try:
-        zf = zipfile.ZipFile(import_file)
-        zf.extractall(temppath)
-        dirs = [f for f in temppath.iterdir() if temppath.joinpath(f).is_dir()]
-        files = [f for f in temppath.iterdir() if temppath.joinpath(f).is_file()]
-        extension = get_extension_from_files(files)
-        if extension is None and dirs:
-            for d in dirs:
-                subdir = temppath.joinpath(d)
-                files = [f for f in subdir.iterdir() if subdir.joinpath(f).is_file()]
-                extension = get_extension_from_files(files)
-                if extension:
-                    for file in files:
-                        file.rename(temppath.joinpath(file.name))
-                    break
-
-        return extension
-
-    except zipfile.BadZipfile:
-        raise ValidationError({field: _("File is not a zip file")})
-
-
-def clean_multipolygon(polygon):
-    multi = None
-    # print("input geom (OGR)")
-    # print(polygon)
-    # print(polygon.geom_type)
-    # print(polygon.geom_count)
-    # print(polygon.srid)
-    if polygon.geom_type in ACCEPTED_GEOMETRIES:
-        # print(polygon.geos.valid_reason)
-        polygon.coord_dim = 2  # coerce 3D geometries to 2D
-        polygon.close_rings()
-        multi = polygon
-        # Convert polygon of rings to multipolygon of polygons, to ensure dissolve
-        if polygon.geom_type == POLYGON:
-            multi = MultiPolygon(OGRGeomType(MULTIPOLYGON), srs=polygon.srid)
-            for part in polygon:
-                points = [(x, y) for x, y in zip(part.x, part.y)]
-                ring = LinearRing(points)
-                poly = GEOSPolygon(ring)
-                multi.add(poly.ogr)
-
-        if multi.empty:
-            multi = None
-
-    return multi
-
-
-def get_multipolygon_from_geometries(geometries):
+        return open_zip(import_file)
+    except zipfile.BadZipFile as e:
+        raise ValidationError({field: str(e)})
+    finally:
+        import_file.seek(0)
+
+
+@contextmanager
+def local_file_path(file):
     """
-    :param geometries: list of geometries of type Polygon or Multipolygon from django.contrib.gis.gdal.geometries
-    :return: django.contrib.gis.gdal.geometries.Multipolygon or None
+    :return: filesystem path GDAL can read file from: the upload's temporary file or the stored file's path, or
+    for uploads held in memory and remotely stored files, a temporary copy written chunk by chunk
     """
-
-    multipolygon = MultiPolygon(OGRGeomType(MULTIPOLYGON), srs=geometries[0].srid)
-    for geometry in geometries:
-        multi = clean_multipolygon(geometry)
-        if multi:
-            multipolygon.add(multi)
-    # print("converted input geoms")
-    # print(multipolygon)
-    # print(multipolygon.geom_type)
-    # print(multipolygon.srid)
-
-    if multipolygon.empty:
+    if hasattr(file, "temporary_file_path"):
+        path = file.temporary_file_path()
+    else:
+        try:
+            path = file.path
+        except (AttributeError, NotImplementedError):  # in memory, or storage without local paths (S3)
+            path = None
+    if path is not None:
+        yield path
+        return
+
+    with NamedTemporaryFile() as f:
+        for chunk in file.chunks():
+            f.write(chunk)
+        f.flush()
+        file.seek(0)
+        yield f.name
+
+
+def get_crs_label(srs):
+    crs_label = srs["PROJCS"] or srs["GEOGCS"] or ""
+    if srs["AUTHORITY"] is not None:
+        crs_label = f"{crs_label} ({srs['AUTHORITY']} {srs['AUTHORITY', 1]})"
+    return crs_label
+
+
+def get_polygons(geometry):
+    if geometry.empty:
+        return
+    if geometry.geom_type == POLYGON:
+        yield geometry
+    elif geometry.geom_type in (MULTIPOLYGON, "GeometryCollection"):
+        # MakeValid may return collections that include collapsed lines or points
+        for part in geometry:
+            yield from get_polygons(part)
+
+
+def get_layer_transform(field, layer):
+    """:return: CoordTransform from the layer's CRS to EPSG:4326, or None if already in it"""
+    if layer.srs is None:
+        raise ValidationError({field: f"{layer.name} is missing CRS"})
+    if layer.srs.srid == TARGET_SRID:
         return None
+    try:
+        return CoordTransform(layer.srs, SpatialReference(TARGET_SRID))
+    except GDALException:
+        raise ValidationError({field: f"Unsupported CRS: {get_crs_label(layer.srs)}"})
 
-    polygon = multipolygon.geos.unary_union.ogr
-    returnmultipolygon = MultiPolygon(OGRGeomType(MULTIPOLYGON), srs=multipolygon.srid)
-    returnmultipolygon.add(polygon)
-    # print("output geom (OGR)")
-    # print(returnmultipolygon)
-    # print(returnmultipolygon.geom_type)
-    # print(returnmultipolygon.srid)
 
-    return returnmultipolygon
+def get_feature_geometry(feature, transform, geom_types=ACCEPTED_GEOMETRIES):
+    """
+    The feature's geometry as a valid 2D GEOS geometry in EPSG:4326, or None if it is null or not one of geom_types.
+    Invalid rings are repaired with MakeValid.
+    """
+    try:
+        geometry = feature.geom
+    except GDALException:  # null geometry
+        return None
+    if geometry.geom_type.name not in geom_types:
+        return None
+    geometry.coord_dim = 2  # coerce 3D geometries to 2D
+    geometry.close_rings()
+    if transform is not None:
+        geometry.transform(transform)
+    geometry = geometry.geos
+    if not geometry.valid:
+        geometry = geometry.make_valid()
+    geometry.srid = TARGET_SRID
+    return geometry
+
+
+def iter_polygons(field, datasource):
+    """
+    Yield the polygons of every polygonal feature in the datasource, one feature at a time, as valid 2D GEOS
+    polygons in EPSG:4326. Features in other CRSs are reprojected; invalid rings are repaired with MakeValid.
+    """
+    for layer in datasource:
+        transform = get_layer_transform(field, layer)
+        for feature in layer:
+            geometry = get_feature_geometry(feature, transform)
+            if geometry is None:
+                continue
+            for polygon in get_polygons(geometry):
+                polygon.srid = TARGET_SRID
+                yield polygon
+
+
+def union_polygons(polygons, batch_size=UNION_BATCH_SIZE):
+    """
+    Cascaded union: polygons are unioned batch_size at a time, then those partial unions batch_size at a time,
+    and so on, so memory is bounded by the batch size rather than the number of input polygons.
+    :return: django.contrib.gis.geos.MultiPolygon or None
+    """
+    levels = []
+
+    def add(level, geometry):
+        if len(levels) == level:
+            levels.append([])
+        levels[level].append(geometry)
+        if len(levels[level]) == batch_size:
+            unioned = GeometryCollection(levels[level], srid=TARGET_SRID).unary_union
+            levels[level] = []
+            add(level + 1, unioned)
+
+    for polygon in polygons:
+        add(0, polygon)
+
+    remaining = [geometry for level in levels for geometry in level]
+    if not remaining:
+        return None
+    unioned = GeometryCollection(remaining, srid=TARGET_SRID).unary_union
+    polygons = list(get_polygons(unioned))
+    if not polygons:
+        return None
+    return MultiPolygon(polygons, srid=TARGET_SRID)
 
 
-def get_multipolygon_from_shp(field, shapefiledir):
+def get_multipolygon_from_file(field, path):
+    """:param path: filesystem or GDAL virtual (/vsi...) path of the data file"""
+    name = PurePosixPath(str(path)).name
     try:
-        ds = DataSource(shapefiledir)
-        shp = ds[0]
-    except (IndexError, GDALException) as e:
+        datasource = DataSource(str(path))
+    except GDALException as e:
         raise ValidationError(
             {
-                field: f"Error parsing shapefile. Are all sidecar files included? Exception: {e}"
+                field: f"Error parsing {name}. Are all sidecar files included? Exception: {e}"
             }
         )
 
-    if (
-        not hasattr(shp, "srs")
-        or not hasattr(shp, "geom_type")
-        or shp.srs is None
-        or shp.geom_type is None
-    ):
-        raise ValidationError({field: f"Shapefile is missing CRS or geometry type"})
-
-    if (
-        shp.srs["GEOGCS"] not in ACCEPTED_GEOGCS
-        and shp.srs["AUTHORITY", 1] not in ACCEPTED_EPSG
-    ):
-        # TODO: Handle other CRSs by transforming
-        crs_label = ""
-        if shp.srs["PROJCS"] is not None:
-            crs_label = shp.srs["PROJCS"]
-        elif shp.srs["GEOGCS"] is not None:
-            crs_label = shp.srs["GEOGCS"]
-        if shp.srs["AUTHORITY"] is not None:
-            crs_label = (
-                f"{crs_label} ({shp.srs['AUTHORITY']} {shp.srs['AUTHORITY', 1]})"
-            )
-        raise ValidationError({field: f"Unsupported shapefile CRS: {crs_label}"})
-
-    if shp.geom_type not in ACCEPTED_GEOMETRIES:
+    try:
+        multipolygon = union_polygons(iter_polygons(field, datasource))
+    except (GDALException, GEOSException):
         raise ValidationError(
-            {field: f"Unsupported shapefile geometry type: {shp.geom_type}"}
+            {
+                field: f"{name} contains geometries that are empty, null, or otherwise invalid"
+            }
         )
 
-    try:
-        geometries = shp.get_geoms()
-        multipolygon = get_multipolygon_from_geometries(geometries)
-        return multipolygon
+    if multipolygon is None:
+        raise ValidationError({field: f"{name} contains no polygon geometries"})
+    return multipolygon
 
-    except GDALException:
+
+def no_data_file_error(field):
+    return ValidationError(
+        {
+            field: _(
+                f"No file with accepted extension found. Supported extensions: {ACCEPTED_EXTENSIONS}"
+            )
+        }
+    )
+
+
+def get_multipolygon_from_zip(field, import_file):
+    # read in place through GDAL's /vsizip/ over the zip on disk; nothing is extracted
+    zf = open_import_zip(field, import_file)
+    member = get_zip_data_member(zf)
+    if member is None:
+        raise no_data_file_error(field)
+    with local_file_path(import_file) as path:
+        return get_multipolygon_from_file(field, f"/vsizip/{path}/{member}")
+
+
+def check_import_file(field, import_file):
+    content_type = import_file.content_type
+    if content_type not in settings.ZIP_MIME_TYPES:
+        raise ValidationError({field: _(f"Filetype not supported: {content_type}")})
+    if import_file.size > MAXIMUM_FILESIZE:
         raise ValidationError(
             {
-                field: f"{shp.name} contains geometries that are empty, null, or otherwise invalid"
+                field: _(
+                    f"Filesize {filesizeformat(import_file.size)} exceeds "
+                    f"maximum of {filesizeformat(MAXIMUM_FILESIZE)}"
+                )
             }
         )
 
 
-def get_multipolygon_from_import_file(import_file_field):
+def validate_import_file(import_file_field):
+    """
+    Checks that are cheap enough to run in the request when parsing is left to a background job:
+    file type, size and the presence of a supported data file in the zip listing.
+    """
     field = import_file_field.field.name
     import_file = import_file_field.file
-    multipolygon = None
 
     try:
-        content_type = import_file.content_type
-        if content_type not in settings.ZIP_MIME_TYPES:
-            raise ValidationError({field: _(f"Filetype not supported: {content_type}")})
-        if import_file.size > MAXIMUM_FILESIZE:
-            raise ValidationError(
-                {
-                    field: _(
-                        f"Filesize {filesizeformat(import_file.size)} exceeds "
-                        f"maximum of {filesizeformat(MAXIMUM_FILESIZE)}"
-                    )
-                }
-            )
+        check_import_file(field, import_file)
+        if get_zip_data_member(open_import_zip(field, import_file)) is None:
+            raise no_data_file_error(field)
+
+    except AttributeError:
+        raise ValidationError({field: _("File is missing an attribute")})
+
 
-        if content_type == "application/zip":
-            with TemporaryDirectory() as tempdir:
-                temppath = Path(tempdir)
-                extension = get_zip_content(import_file_field, temppath)
-                if extension is None:
-                    raise ValidationError(
-                        {
-                            field: _(
-                                f"No file with accepted extension found. Supported extensions: {ACCEPTED_EXTENSIONS}"
-                            )
-                        }
-                    )
-
-                if extension == ".shp":
-                    multipolygon = get_multipolygon_from_shp(field, temppath)
-                # handle other compressed filetypes here
+def get_multipolygon_from_import_file(import_file_field, content_hash):
+    """
+    :param content_hash: get_content_hash of the upload, computed once by the caller
+    :return: django.contrib.gis.geos.MultiPolygon (EPSG:4326) dissolved from the polygons in the uploaded zip.
+    The result is kept on the uploaded file keyed by content hash, so validating the same upload again (e.g. by
+    the serializer and then by save) doesn't parse it again.
+    """
+    field = import_file_field.field.name
+    import_file = import_file_field.file
+
+    try:
+        check_import_file(field, import_file)
+        cached = getattr(import_file, "_parsed_multipolygon", None)
+        if cached is not None and cached[0] == content_hash:
+            return cached[1]
 
+        multipolygon = get_multipolygon_from_zip(field, import_file)
+        import_file._parsed_multipolygon = (content_hash, multipolygon)
         return multipolygon
 
     except AttributeError:
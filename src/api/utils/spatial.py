@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import GeoFunc
+from django.db import connection
+from django.db.models import FloatField, Func
+
+
+class SimplifyPreserveTopology(GeoFunc):
+    function = "ST_SimplifyPreserveTopology"
+
+
+class Multi(GeoFunc):
+    function = "ST_Multi"
+
+
+class GeodesicArea(Func):
+    # square meters on the WGS84 spheroid, whatever the extent of the geometry
+    template = "ST_Area(%(expressions)s::geography)"
+    output_field = FloatField()
+
+
+class BoundingBoxDistance(GeoFunc):
+    # the `<->` operator; ordered by with a LIMIT, it is a nearest-neighbour scan of the GiST index
+    function = ""
+    arg_joiner = " <-> "
+    template = "(%(expressions)s)"
+    geom_param_pos = (0, 1)
+    output_field = FloatField()
+
+
+class GeometryFetchError(AssertionError):
+    pass
+
+
+@contextmanager
+def forbid_geometry_fetch():
+    """
+    Raise GeometryFetchError for any ORM query run inside the block that returns geometry values, e.g. through
+    select_related without defer. Filtering and ordering on geometry is still allowed. Checked on the compiled
+    select list (the output field of each column), not the SQL text.
+    """
+    ops = connection.ops
+    get_db_converters = ops.get_db_converters
+
+    def guarded_get_db_converters(expression):
+        if isinstance(expression.output_field, GeometryField):
+            raise GeometryFetchError(f"Geometry fetched: {expression}")
+        return get_db_converters(expression)
+
+    ops.get_db_converters = guarded_get_db_converters
+    try:
+        yield
+    finally:
+        del ops.get_db_converters
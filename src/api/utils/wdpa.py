@@ -0,0 +1,290 @@
+import datetime
+import hashlib
+from collections import Counter
+from decimal import Decimal
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.gdal.error import GDALException
+from django.contrib.gis.geos import MultiPoint
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone, translation
+from django_countries import countries
+from modeltranslation import settings as mt_settings
+from . import chunked
+from .assessment import DATA_GENERATION, bump_generation
+from .management import (
+    ACCEPTED_GEOMETRIES,
+    get_feature_geometry,
+    get_layer_transform,
+    get_polygons,
+    union_polygons,
+)
+from ..models import ManagementArea, ProtectedArea
+
+
+WDPA_ID = "WDPAID"
+# WDPA attributes loaded into draft management areas; a change to any of them (or to the geometry) is reloaded
+WDPA_FIELDS = ("NAME", "ISO3", "STATUS_YR", "REP_AREA", "DESIG_TYPE")
+POINT_GEOMETRIES = ("Point", "Point25D", "MultiPoint", "MultiPoint25D")
+RECOGNITION_LEVELS = {
+    "International": [ManagementArea.INTERNATIONAL],
+    "National": [ManagementArea.NATIONAL],
+}
+MANAGEMENT_AREA_FIELDS = [
+    "name",
+    "protected_area",
+    "countries",
+    "date_established",
+    "reported_size",
+    "recognition_level",
+    "polygon",
+    "point",
+    "wdpa_hash",
+]
+BATCH_SIZE = 500
+
+
+class WDPARecord:
+    """
+    A WDPA site: the attributes of its first feature and a hash of all its features' attributes and source geometry.
+    Polygons and points are only read (see read_wdpa_geometries) for sites that need loading.
+    """
+
+    def __init__(self, wdpa_id, attributes):
+        self.wdpa_id = wdpa_id
+        self.attributes = attributes
+        self.polygons = []
+        self.points = []
+        self._hash = hashlib.sha256()
+
+    @property
+    def name(self):
+        return (self.attributes.get("NAME") or f"WDPA {self.wdpa_id}")[:255]
+
+    @property
+    def hash(self):
+        return self._hash.hexdigest()
+
+    def add_feature(self, attributes, wkb):
+        self._hash.update(repr(sorted(attributes.items())).encode())
+        if wkb is not None:
+            self._hash.update(wkb)
+
+    def add_geometry(self, geometry):
+        if geometry is None:
+            return
+        if geometry.geom_type in POINT_GEOMETRIES:
+            self.points.extend(geometry if geometry.geom_type == "MultiPoint" else [geometry])
+        else:
+            self.polygons.extend(get_polygons(geometry))
+
+    def get_countries(self):
+        iso3 = self.attributes.get("ISO3") or ""
+        return [c for c in (countries.alpha2(code.strip()) for code in iso3.split(";")) if c]
+
+    def get_management_area_values(self, protected_area_ids):
+        status_year = int(self.attributes.get("STATUS_YR") or 0)
+        reported_area = self.attributes.get("REP_AREA") or 0  # km2
+        polygon = union_polygons(self.polygons)
+        point = None
+        if polygon is None and self.points:
+            point = MultiPoint(self.points, srid=self.points[0].srid).centroid
+        # geometry is only needed until the row is written
+        self.polygons = []
+        self.points = []
+        return {
+            "name": self.name,
+            "protected_area_id": protected_area_ids.get(self.wdpa_id),
+            "countries": self.get_countries(),
+            "date_established": datetime.date(status_year, 1, 1) if status_year else None,
+            "reported_size": (Decimal(str(reported_area)) * 100).quantize(Decimal("0.01"))
+            if reported_area
+            else None,
+            "recognition_level": RECOGNITION_LEVELS.get(self.attributes.get("DESIG_TYPE"), []),
+            "polygon": polygon,
+            "point": point,
+            "wdpa_hash": self.hash,
+        }
+
+
+def iter_wdpa_layers(paths):
+    """Yield (layer, fields) for each layer with a WDPAID field; the source table and other layers are skipped."""
+    for path in paths:
+        try:
+            datasource = DataSource(str(path))
+        except GDALException as e:
+            raise ValidationError({"path": f"Error opening {path}: {e}"})
+
+        for layer in datasource:
+            if WDPA_ID not in layer.fields:
+                continue
+            yield layer, [f for f in WDPA_FIELDS if f in layer.fields]
+
+
+def get_feature_wkb(feature):
+    # source geometry as stored, for hashing without building GEOS geometry
+    try:
+        return bytes(feature.geom.wkb)
+    except GDALException:  # null geometry
+        return None
+
+
+def read_wdpa(paths, iso3=None):
+    """
+    Read the attributes of the polygon and point layers of local WDPA exports (GeoPackage, shapefile or File
+    Geodatabase), hashing each site's features; geometry is read afterwards for the sites that changed.
+    :param iso3: optional collection of ISO3 codes; only sites in one of those countries are read
+    :return: {WDPA id: WDPARecord}
+    """
+    records = {}
+    for layer, fields in iter_wdpa_layers(paths):
+        for feature in layer:
+            attributes = {f: feature.get(f) for f in fields}
+            if iso3 and not iso3 & set((attributes.get("ISO3") or "").split(";")):
+                continue
+            wdpa_id = int(feature.get(WDPA_ID))
+            if wdpa_id not in records:
+                records[wdpa_id] = WDPARecord(wdpa_id, attributes)
+            records[wdpa_id].add_feature(attributes, get_feature_wkb(feature))
+    return records
+
+
+def read_wdpa_geometries(paths, records):
+    """Add polygons and points to records, a subset of those returned by read_wdpa, in a second pass over paths."""
+    if not records:
+        return
+    for layer, _ in iter_wdpa_layers(paths):
+        transform = get_layer_transform("path", layer)
+        for feature in layer:
+            record = records.get(int(feature.get(WDPA_ID)))
+            if record is not None:
+                record.add_geometry(
+                    get_feature_geometry(feature, transform, ACCEPTED_GEOMETRIES + POINT_GEOMETRIES)
+                )
+
+
+def load_protected_areas(records, batch_size=BATCH_SIZE):
+    """
+    Bulk create a ProtectedArea for each WDPA site without one, keyed by WDPA id. Names are unique, so a site
+    takes over an existing protected area of its name not yet linked to WDPA, unless other sites being loaded share
+    the name; otherwise a site whose name is taken or shared gets "<name> (WDPA <id>)".
+    :return: ({WDPA id: ProtectedArea id}, number created)
+    """
+    ids = {}
+    for chunk in chunked(records, batch_size):
+        ids.update(ProtectedArea.objects.filter(wdpa_id__in=chunk).values_list("wdpa_id", "pk"))
+    missing = [record for wdpa_id, record in records.items() if wdpa_id not in ids]
+    name_counts = Counter(record.name for record in records.values())
+    taken = {}
+    for chunk in chunked({record.name for record in missing}, batch_size):
+        rows = ProtectedArea.objects.filter(name__in=chunk).values_list("name", "pk", "wdpa_id")
+        taken.update((name, (pk, wdpa_id)) for name, pk, wdpa_id in rows)
+
+    now = timezone.now()
+    to_claim = []
+    to_create = []
+    for record in missing:
+        shared = name_counts[record.name] > 1
+        if record.name in taken:
+            pk, wdpa_id = taken[record.name]
+            if wdpa_id is None and not shared:
+                to_claim.append(ProtectedArea(pk=pk, wdpa_id=record.wdpa_id, updated_on=now))
+                continue
+        if record.name in taken or shared:
+            name = f"{record.name[:230]} (WDPA {record.wdpa_id})"
+        else:
+            name = record.name
+        to_create.append(ProtectedArea(name=name, wdpa_id=record.wdpa_id))
+
+    with transaction.atomic():
+        ProtectedArea.objects.bulk_update(to_claim, ["wdpa_id", "updated_on"], batch_size=batch_size)
+        ProtectedArea.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+    for chunk in chunked([record.wdpa_id for record in missing], batch_size):
+        ids.update(ProtectedArea.objects.filter(wdpa_id__in=chunk).values_list("wdpa_id", "pk"))
+    # bulk_create returns every object given, including rows skipped as conflicts; none of these WDPA ids
+    # were in the database before, so those found now were inserted
+    created = sum(1 for protected_area in to_create if protected_area.wdpa_id in ids)
+    return ids, created
+
+
+def load_management_areas(records, protected_area_ids, paths, batch_size=BATCH_SIZE):
+    """
+    Bulk create a draft management area for each WDPA site without one, and bulk update drafts whose WDPA record
+    changed since they were loaded. Drafts are areas created by this loader (wdpa_hash set) that no user has saved
+    since; areas entered or edited by users are never overwritten. Hashes are compared before any geometry is read,
+    so only new and changed sites have their geometry built (see read_wdpa_geometries).
+    :return: {"created": n, "updated": n, "unchanged": n, "skipped": n}
+    """
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    to_create = []
+    to_update = {}  # {WDPA id: management area pk}
+    for chunk in chunked(records.values(), batch_size):
+        existing = {}
+        rows = (
+            ManagementArea.objects.filter(
+                wdpa_protected_area__in=[record.wdpa_id for record in chunk]
+            )
+            .order_by("wdpa_hash")  # loader drafts sort last, so win over user areas with the same WDPA id
+            .values_list("wdpa_protected_area", "pk", "wdpa_hash", "updated_by")
+        )
+        for wdpa_id, pk, wdpa_hash, updated_by in rows:
+            existing[wdpa_id] = (pk, wdpa_hash, updated_by)
+
+        for record in chunk:
+            if record.wdpa_id not in existing:
+                to_create.append(record)
+                continue
+            pk, wdpa_hash, updated_by = existing[record.wdpa_id]
+            if not wdpa_hash or updated_by is not None:
+                counts["skipped"] += 1
+            elif wdpa_hash == record.hash:
+                counts["unchanged"] += 1
+            else:
+                to_update[record.wdpa_id] = pk
+
+    loading = to_create + [records[wdpa_id] for wdpa_id in to_update]
+    read_wdpa_geometries(paths, {record.wdpa_id: record for record in loading})
+
+    loaded_pks = []
+    for chunk in chunked(loading, batch_size):
+        created = []
+        updated = []
+        # bulk_update doesn't apply auto_now; updated_on also moves data_generation() for report exports
+        now = timezone.now()
+        for record in chunk:
+            values = record.get_management_area_values(protected_area_ids)
+            if record.wdpa_id in to_update:
+                updated.append(ManagementArea(pk=to_update[record.wdpa_id], updated_on=now, **values))
+            else:
+                created.append(ManagementArea(wdpa_protected_area=record.wdpa_id, **values))
+
+        # bulk operations skip ManagementArea.save() (full_clean, derived geometries, spatial relations),
+        # which are instead updated set-based below
+        with transaction.atomic():
+            # no ignore_conflicts: every object returned was inserted
+            created = ManagementArea.objects.bulk_create(created, batch_size=batch_size)
+            counts["updated"] += ManagementArea.objects.bulk_update(
+                updated, MANAGEMENT_AREA_FIELDS + ["updated_on"], batch_size=batch_size
+            )
+        counts["created"] += len(created)
+        loaded_pks.extend(obj.pk for obj in created + updated)
+
+    if loaded_pks:
+        loaded = ManagementArea.objects.filter(pk__in=loaded_pks)
+        loaded.update_derived_geometries()
+        loaded.update_spatial_relations()
+        # bulk writes send no signals; invalidate cached tiles and clusters
+        bump_generation(DATA_GENERATION)
+    return counts
+
+
+def load_wdpa(records, paths, management_areas=False, batch_size=BATCH_SIZE):
+    # names are loaded into the default-language translation fields
+    with translation.override(mt_settings.DEFAULT_LANGUAGE):
+        protected_area_ids, created = load_protected_areas(records, batch_size)
+        counts = {"protected_areas_created": created}
+        if management_areas:
+            counts.update(
+                load_management_areas(records, protected_area_ids, paths, batch_size)
+            )
+    return counts
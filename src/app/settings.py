@@ -93,6 +93,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "app.wsgi.application"
+TEST_RUNNER = "api.tests.runner.TestRunner"
 
 
 # Database
@@ -112,6 +113,21 @@ if ENVIRONMENT in ("dev", "prod"):
     DATABASES["default"]["OPTIONS"] = {"sslmode": "require"}
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # generation tokens keying cached output; shared by the web and worker processes, so a change made in one
+    # invalidates what the others have cached. Table created by migration 0012.
+    "generations": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "api_cache_generations",
+        "TIMEOUT": None,
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -163,9 +179,31 @@ MODELTRANSLATION_FALLBACK_LANGUAGES = {
 APPNAME = "elinor"
 SITE_ID = 1
 GEO_PRECISION = 6  # to nearest 10 cm
+# degrees; stored ManagementArea.polygon_<level> variants for overview maps (~1 km, ~100 m at the equator)
+GEOMETRY_SIMPLIFY_TOLERANCES = {"low": 0.01, "medium": 0.001}
+# bytes; larger management area import files are parsed by the background worker rather than in the request
+GEOMETRY_IMPORT_ASYNC_SIZE = 1048576
+# fail API requests that select geometry columns in view actions not listed in the view's geometry_actions;
+# turned on for the test suite by TEST_RUNNER
+GEOMETRY_FETCH_GUARD = False
 ATTRIBUTE_NORMALIZER = 10
 EXCEL_MIME_TYPES = ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"]
+XLSX_SPOOL_MAX_SIZE = 1048576  # generated workbooks larger than this are buffered on disk rather than in memory
+XLSX_WORKERS = 2  # processes per web/command process parsing or generating workbooks in bulk imports and exports
+XLSX_IMPORT_BATCH_SIZE = 10  # workbooks saved per transaction in bulk imports
 ZIP_MIME_TYPES = ["application/zip", "application/x-zip-compressed"]
+# limits on uploaded zips, checked before reading any member; see utils.open_zip
+ZIP_MAX_MEMBERS = 100
+ZIP_MAX_SIZE = 104857600  # 100MB uncompressed
+ZIP_MAX_RATIO = 100  # zip bomb guard
+REPORT_EXPORT_MAX_AGE = 86400  # seconds a built report is reused for identical requests, then removed by runworker
+REPORT_EXPORT_TIMEOUT = 3600  # seconds before a running report export is considered abandoned
+TILE_EXTENT = 4096  # vector tile coordinate space
+TILE_BUFFER = 64  # tile coordinate units kept beyond the tile edge so clipped features join seamlessly
+TILE_MAX_ZOOM = 22
+TILE_SIMPLIFY_MAX_ZOOM = {"low": 6, "medium": 10}  # highest zoom served from each simplified polygon variant
+TILE_CACHE_TIMEOUT = 86400  # tiles are also invalidated by cache_generation, so this only bounds cache size
+CLUSTER_GRID_PIXELS = 64  # on-screen size of the grid cells assessments are clustered into
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -184,6 +222,7 @@ REST_FRAMEWORK = {
     ),
     "EXCEPTION_HANDLER": "api.resources.api_exception_handler",
     "NON_FIELD_ERRORS_KEY": "non_field_errors",
+    "DEFAULT_THROTTLE_RATES": {"xlsx_bulk": "20/hour"},
 }
 
 CORS_ORIGIN_ALLOW_ALL = True